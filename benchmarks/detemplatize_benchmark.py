@@ -0,0 +1,55 @@
+"""
+Compare the compiled and numpy detemplatize kernels on large styled templates.
+
+Usage: python benchmarks/detemplatize_benchmark.py
+(build the extension first with `python build.py build_ext --inplace`)
+"""
+import os
+import sys
+import timeit
+from functools import partial
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# pylint: disable = wrong-import-position, import-error, no-name-in-module
+from handlers.pxls.detemplatize_fallback import numpy_detemplatize
+from handlers.pxls.detemplatize import fast_detemplatize
+
+
+def styled_template(width: int, height: int, block_size: int) -> np.ndarray:
+    """
+    Generate a random dotted-style template image.
+    """
+    rng = np.random.default_rng(0)
+    image = np.zeros((height * block_size, width * block_size, 4), dtype=np.uint8)
+    center = block_size // 2
+    dots = image[center::block_size, center::block_size]
+    dots[...] = rng.integers(0, 256, dots.shape, dtype=np.uint8)
+    dots[..., 3] = rng.choice([0, 255], (height, width), p=[0.3, 0.7])
+    return image
+
+
+def main():
+    """
+    Check that both kernels agree, and print their mean run time on each size.
+    """
+    for width, height, block_size in [(500, 500, 3), (1000, 1000, 5), (2000, 2000, 3)]:
+        image = styled_template(width, height, block_size)
+        expected = numpy_detemplatize(image, height, width, block_size)
+        assert np.array_equal(
+            fast_detemplatize(image, height, width, block_size), expected
+        )
+        print(f"{width}x{height}, block size {block_size}:")
+        for name, kernel in [
+            ("cython", fast_detemplatize),
+            ("numpy", numpy_detemplatize),
+        ]:
+            # Bind the loop's current values, rather than closing over its variables.
+            timer = timeit.Timer(partial(kernel, image, height, width, block_size))
+            runs, total = timer.autorange()
+            print(f"  {name:>6}: {1000 * total / runs:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
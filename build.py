@@ -0,0 +1,24 @@
+"""
+Build the Cython extensions in place, with OpenMP enabled.
+
+Usage: python build.py build_ext --inplace
+"""
+import numpy as np
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+extensions = [
+    Extension(
+        name="handlers.pxls.detemplatize",
+        sources=["src/handlers/pxls/detemplatize.pyx"],
+        include_dirs=[np.get_include()],
+        extra_compile_args=["-O3", "-fopenmp"],
+        extra_link_args=["-fopenmp"],
+    )
+]
+
+setup(
+    name="pycharity-extensions",
+    package_dir={"": "src"},
+    ext_modules=cythonize(extensions, compiler_directives={"language_level": "3"}),
+)
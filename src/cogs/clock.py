@@ -1,11 +1,25 @@
 from datetime import datetime
+from typing import Dict, Tuple
 import logging
 from discord.ext import tasks, commands
-from handlers.pxls import compute_progress, Template, layer
-from handlers.setup import canvas, ws_client, template_manager, stats_manager, base_url
+from handlers.pxls import compute_progress_batch, Progress, Template, layer
+from handlers.http_client import http_client
+from handlers.setup import (
+    canvas,
+    ws_client,
+    template_manager,
+    stats_manager,
+    progress_tracker,
+    history,
+    base_url,
+)
 
 logger = logging.getLogger("pyCharity." + __name__)
 
+# Number of ticks between two full progress recomputations. In between,
+# progress comes from the live tracker fed by the websocket.
+CONSISTENCY_CHECK_TICKS = 12
+
 
 class Clock(commands.Cog):
     """
@@ -16,6 +30,10 @@ class Clock(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.last_updated_stats = datetime.now()
+        self.ticks = 0
+        # Board version at which each template's progress was last computed,
+        # by (canvas code, template name).
+        self.computed_versions: Dict[Tuple[str, str], int] = {}
         # pylint: disable = no-member
         self.update_board.start()
 
@@ -26,69 +44,164 @@ class Clock(commands.Cog):
     @tasks.loop(minutes=5)
     async def update_board(self):
         """Update the canvas info and template progress periodically."""
-        # Update canvas
         try:
-            await canvas.update_info()
-            ws_client.pause()
-            board = await canvas.fetch_board()
-            canvas.board = board
-            logger.debug("Board updated.")
-            ws_client.resume()
+            await self._update_canvas()
         except Exception as error:
             logger.warning(f"Error while fetching board: {error}")
-        # Update stats
+        if history is not None:
+            try:
+                await self._save_keyframe()
+            except Exception as error:
+                logger.warning(f"Error while saving history keyframe: {error}")
         try:
-            stats = await canvas.fetch_stats()
-            if stats.time != self.last_updated_stats:
-                await stats_manager.add_record(stats)
-                self.last_updated_stats = stats.time
-                logger.debug("Updated stats.")
+            await self._update_stats()
         except Exception as error:
             logger.warning(f"Error while updating stats: {error}")
-
-        # Update progress
         try:
-            templates = template_manager.get_templates(canvas_code=canvas.code)
-            async for template in templates:
-                new_progress = await compute_progress(canvas, template)
-                await template_manager.update_template(
-                    template, data={"progress": new_progress.to_dict()}
-                )
-            logger.debug("Updated template progress.")
+            await self._update_progress()
         except Exception as error:
             logger.warning(f"Error while updating template progress: {error}")
-        # Generate combo
         try:
-            combo, combo_exists = None, False
-            templates = template_manager.get_templates(
-                canvas_code=canvas.code, scope={"$ne": "private"}
-            )
-            async for template in templates:
-                if combo is None:
-                    combo = template
-                elif template.name == "combo":
-                    combo_exists = True
-                else:
-                    combo = await layer(
-                        canvas.board.width, canvas.board.height, combo, template
-                    )
-            if not combo is None:
-                owner = self.bot.user.id
-                combo = await Template.from_base(
-                    base_template=combo,
-                    name="combo",
-                    url=base_url,
-                    owner=owner,
-                    canvas=canvas,
-                    scope="global",
-                )
-                if combo_exists:
-                    await template_manager.update_template(combo)
-                else:
-                    await template_manager.add_template(combo)
-                logger.debug("Generated combo.")
+            await self._generate_combo()
         except Exception as error:
             logger.warning(f"Error while generating combo: {error}")
+        self.ticks += 1
+
+    @staticmethod
+    async def _update_canvas():
+        """
+        Update the canvas info and board, and log the client metrics.
+        """
+        await canvas.update_info()
+        await canvas.update_board()
+        canvas.activity.decay()
+        logger.debug("Board updated.")
+        metrics = ws_client.metrics.report()
+        logger.debug(
+            f"Websocket: {metrics['messages_per_s']:.1f} messages/s,"
+            f" {metrics['pixels_per_s']:.1f} pixels/s,"
+            f" queue depth {metrics['queue_depth']}"
+            f" (max {metrics['max_queue_depth']}),"
+            f" apply latency {metrics['apply_latency_ms']:.2f}ms"
+            f" (max {metrics['max_apply_latency_ms']:.2f}ms)."
+        )
+        for endpoint, stats in http_client.report().items():
+            logger.debug(
+                f"HTTP {endpoint}: {stats['requests']} requests,"
+                f" {stats['errors']} errors, {stats['retries']} retries,"
+                f" latency {stats['mean_latency_ms']:.0f}ms"
+                f" (max {stats['max_latency_ms']:.0f}ms)."
+            )
+
+    @staticmethod
+    async def _save_keyframe():
+        """
+        Save a board history keyframe, if the last one is old enough.
+        """
+        if await history.maybe_add_keyframe():
+            logger.debug("Saved board history keyframe.")
+
+    async def _update_stats(self):
+        """
+        Save the canvas stats, if they changed.
+        """
+        stats = await canvas.fetch_stats()
+        if stats.time != self.last_updated_stats:
+            await stats_manager.add_record(stats)
+            self.last_updated_stats = stats.time
+            logger.debug("Updated stats.")
+
+    async def _update_progress(self):
+        """
+        Update the progress of the canvas' templates, recomputing the ones
+        that aren't tracked yet, and, on full checks, the ones the board
+        changed under since their last computation.
+        """
+        full_check = self.ticks % CONSISTENCY_CHECK_TICKS == 0
+        code = canvas.code
+        progress_tracker.retain_canvas(code)
+        # Images come from the template manager's cache unless they changed.
+        templates = template_manager.get_templates(canvas_code=code)
+        templates = [template async for template in templates]
+        names = {template.name for template in templates}
+        self.computed_versions = {
+            key: version
+            for key, version in self.computed_versions.items()
+            if key[0] == code and key[1] in names
+        }
+        stale = [
+            template
+            for template in templates
+            if progress_tracker.get(code, template.name) is None
+            or (code, template.name) not in self.computed_versions
+            or (
+                full_check
+                and canvas.changed_since(
+                    template, self.computed_versions[(code, template.name)]
+                )
+            )
+        ]
+        progresses = await compute_progress_batch(canvas, stale)
+        for template, new_progress in zip(stale, progresses):
+            self._track(template, new_progress)
+        for template in templates:
+            new_progress = progress_tracker.get(code, template.name)
+            if new_progress is None:
+                continue
+            if new_progress.to_dict() != template.progress.to_dict():
+                await template_manager.update_template(
+                    template, data={"progress": new_progress.to_dict()}
+                )
+        logger.debug(
+            "Recomputed template progress."
+            if full_check
+            else "Updated template progress."
+        )
+
+    async def _generate_combo(self):
+        """
+        Layer every public template into the combo template.
+        """
+        combo, combo_exists = None, False
+        templates = template_manager.get_templates(
+            canvas_code=canvas.code, scope={"$ne": "private"}
+        )
+        async for template in templates:
+            if combo is None:
+                combo = template
+            elif template.name == "combo":
+                combo_exists = True
+            else:
+                combo = await layer(
+                    canvas.board.width, canvas.board.height, combo, template
+                )
+        if not combo is None:
+            owner = self.bot.user.id
+            combo = await Template.from_base(
+                base_template=combo,
+                name="combo",
+                url=base_url,
+                owner=owner,
+                canvas=canvas,
+                scope="global",
+            )
+            if combo_exists:
+                await template_manager.update_template(combo)
+            else:
+                await template_manager.add_template(combo)
+            self._track(combo, combo.progress)
+            logger.debug("Generated combo.")
+
+    def _track(self, template: Template, progress: Progress):
+        """
+        Track a template from its freshly computed progress. Templates whose
+        tracked progress is approximate are recomputed on the next tick.
+        """
+        key = (template.canvas_code, template.name)
+        if progress_tracker.track(template, progress):
+            self.computed_versions[key] = progress.version
+        else:
+            self.computed_versions.pop(key, None)
 
     @update_board.before_loop
     async def before(self):
@@ -1,7 +1,13 @@
 import discord
 from discord.ext import commands
 from discord_slash import cog_ext, SlashContext
-from handlers.setup import GUILD_IDS, canvas, EMBED_COLOR
+from handlers.setup import (
+    GUILD_IDS,
+    canvas,
+    EMBED_COLOR,
+    render_cache,
+    BOARD_MAX_AGE,
+)
 from handlers.discord_utils import attach_image
 
 
@@ -16,7 +22,10 @@ class BoardCommand(commands.Cog):
     )
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def _board(self, ctx: SlashContext):
-        image = await canvas.board.render(canvas.palette)
+        board = canvas.board.snapshot(max_age=BOARD_MAX_AGE)
+        image = await render_cache.png(
+            board, canvas.palette, key=("board", canvas.code, board.version)
+        )
         embed = discord.Embed(title="Board", color=EMBED_COLOR)
         file = attach_image(image, embed)
         await ctx.send(file=file, embed=embed)
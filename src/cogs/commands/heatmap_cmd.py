@@ -0,0 +1,60 @@
+from typing import Optional
+import discord
+from aioify import aioify
+from discord.ext import commands
+from discord_slash import cog_ext, SlashContext
+from discord_slash.utils.manage_commands import create_option
+from handlers.setup import GUILD_IDS, canvas, EMBED_COLOR, template_manager
+from handlers.discord_utils import UserError, attach_image
+from handlers.image import image2buffer
+from handlers.pxls import utils, BaseTemplate
+
+
+class HeatmapCommand(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @cog_ext.cog_slash(
+        name="heatmap",
+        description="Show where pixels are being placed.",
+        guild_ids=GUILD_IDS,
+        options=[
+            create_option(
+                name="template",
+                description="Template name or link to crop the heatmap to.",
+                option_type=3,
+                required=False,
+            )
+        ],
+    )
+    @commands.cooldown(1, 10, commands.BucketType.user)
+    async def _heatmap(self, ctx: SlashContext, template: Optional[str] = None):
+        await ctx.defer()
+        template_name = template
+        board = canvas.board.snapshot()
+        if template_name is None:
+            board_image = await board.render(canvas.palette)
+            image = await canvas.activity.render(board_image)
+        else:
+            if utils.check_template_link(template_name):
+                template = await BaseTemplate.from_url(template_name, canvas)
+            else:
+                template = await template_manager.get_template(
+                    name=template_name, canvas_code=canvas.code
+                )
+                if template is None:
+                    raise UserError(f"`{template_name}` isn't a valid template name.")
+                if template.scope == "private" and ctx.author_id != template.owner:
+                    raise UserError("This template is private.")
+            crop = (template.ox, template.oy, template.width, template.height)
+            board_image = await board.render(canvas.palette, crop=crop)
+            image = await canvas.activity.render(board_image, template.ox, template.oy)
+        # Encoding the full-canvas RGBA heatmap would block the event loop.
+        buffer = await aioify(image2buffer)(image)
+        embed = discord.Embed(title="Heatmap", color=EMBED_COLOR)
+        file = attach_image(buffer, embed)
+        await ctx.send(file=file, embed=embed)
+
+
+def setup(bot):
+    bot.add_cog(HeatmapCommand(bot))
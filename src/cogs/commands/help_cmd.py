@@ -26,6 +26,11 @@ class HelpCommand(commands.Cog):
                 "`/reduce <url>`: Convert any image to the pxls palette. url should be"
                 " a link to an image."
             ),
+            "heatmap": (
+                "`/heatmap {template}`: Show where pixels are being placed, optionally"
+                " cropped to a template. You can use template links or names from the"
+                " tracker."
+            ),
             "users": "`/users`: Show the number of active users on pxls.space.",
             "stats": (
                 "`/stats <username_0> {username_1}`: Plot a user's placing activity"
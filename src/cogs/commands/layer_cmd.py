@@ -1,3 +1,4 @@
+import asyncio
 import discord
 from discord.ext import commands
 from discord_slash import cog_ext, SlashContext
@@ -13,6 +14,7 @@ from handlers.setup import (
 )
 from handlers.discord_utils import UserError, ask_alternatives, attach_image, button
 from handlers.pxls import utils, BaseTemplate, layer
+from handlers.image import PalettizedImage, palettized2buffer
 
 
 class LayerCommand(commands.Cog):
@@ -37,21 +39,22 @@ class LayerCommand(commands.Cog):
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def _layer(self, ctx: SlashContext, **template_names):
         await ctx.defer()
-        templates = []
-        for template_name in template_names.values():
+
+        async def resolve(template_name):
             if utils.check_template_link(template_name):
-                template = await BaseTemplate.from_url(template_name, canvas)
-            else:
-                template = await template_manager.get_template(
-                    name=template_name, canvas_code=canvas.code
-                )
-                if template is None:
-                    raise UserError(f"{template_name} isn't a valid template name.")
-            templates.append(template)
+                return await BaseTemplate.from_url(template_name, canvas)
+            template = await template_manager.get_template(
+                name=template_name, canvas_code=canvas.code
+            )
+            if template is None:
+                raise UserError(f"{template_name} isn't a valid template name.")
+            return template
+
+        templates = await asyncio.gather(*map(resolve, template_names.values()))
         layered_template = await layer(
             canvas.board.width, canvas.board.height, *templates
         )
-        image = await layered_template.render(canvas.palette)
+        image = await palettized2buffer(layered_template, canvas.palette)
         embed = discord.Embed(title="Layered!", color=EMBED_COLOR)
         file = attach_image(image, embed)
         buttons = [button("Generate template link")]
@@ -59,8 +62,12 @@ class LayerCommand(commands.Cog):
             ctx, self.bot, buttons, raise_error=False, file=file, embed=embed
         )
         if button_pressed:
-            styled_image = await utils.style_dotted(image)
-            styled_url = await image_uploader.upload_image(styled_image)
+            styled_image = await utils.style_dotted(
+                layered_template.image, fill_value=255
+            )
+            styled_url = await image_uploader.upload_palettized(
+                PalettizedImage(styled_image), canvas.palette
+            )
             url = utils.generate_template_url(layered_template, base_url, styled_url)
             url_button = button("Template link", style="URL", url=url)
             await button_pressed.edit_origin(components=[create_actionrow(url_button)])
@@ -5,7 +5,7 @@ from discord_slash.utils.manage_commands import create_option
 from handlers.setup import GUILD_IDS, canvas, EMBED_COLOR, template_manager
 from handlers.discord_utils import UserError, attach_image
 from handlers.pxls import utils, BaseTemplate, compute_progress
-from handlers.image import PalettizedImage
+from handlers.image import PalettizedImage, palettized2buffer
 
 
 class ProgressCommand(commands.Cog):
@@ -42,8 +42,9 @@ class ProgressCommand(commands.Cog):
         progress = await compute_progress(
             canvas=canvas, template=template, compute_array=True
         )
-        image = await PalettizedImage(progress.array).render(
-            [(255, 0, 0, 255), (0, 255, 0, 255), (70, 70, 70, 100)]
+        image = await palettized2buffer(
+            PalettizedImage(progress.array),
+            [(255, 0, 0, 255), (0, 255, 0, 255), (70, 70, 70, 100)],
         )
         description = (
             f"{progress.percentage:.1f}% complete"
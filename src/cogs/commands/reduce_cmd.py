@@ -5,7 +5,7 @@ from discord_slash.utils.manage_commands import create_option
 from handlers.setup import GUILD_IDS, canvas, EMBED_COLOR
 from handlers.discord_utils import attach_image
 from handlers.pxls import Template
-from handlers.image import PalettizedImage, download_image
+from handlers.image import PalettizedImage, download_image, palettized2buffer
 
 
 class ReduceCommand(commands.Cog):
@@ -30,7 +30,9 @@ class ReduceCommand(commands.Cog):
         await ctx.defer()
         image = await download_image(url)
         recolored_array = await Template.reduce(image, canvas.palette)
-        recolored_image = await PalettizedImage(recolored_array).render(canvas.palette)
+        recolored_image = await palettized2buffer(
+            PalettizedImage(recolored_array), canvas.palette
+        )
         embed = discord.Embed(title="Reduced!", color=EMBED_COLOR)
         file = attach_image(recolored_image, embed)
         await ctx.send(file=file, embed=embed)
@@ -3,7 +3,14 @@ import discord
 from discord.ext import commands
 from discord_slash import cog_ext, SlashContext
 from discord_slash.utils.manage_commands import create_option
-from handlers.setup import GUILD_IDS, canvas, template_manager, EMBED_COLOR
+from handlers.setup import (
+    GUILD_IDS,
+    canvas,
+    template_manager,
+    progress_tracker,
+    render_cache,
+    EMBED_COLOR,
+)
 from handlers.discord_utils import (
     render_list,
     UserError,
@@ -87,7 +94,10 @@ class TemplateCommand(commands.Cog):
             base_template, name, url, canvas, owner, scope
         )
         await template_manager.add_template(template)
-        file, embed = await template_preview(template, self.bot, canvas, EMBED_COLOR)
+        progress_tracker.track(template, template.progress)
+        file, embed = await template_preview(
+            template, self.bot, canvas, EMBED_COLOR, render_cache
+        )
         await ctx.message.edit(content="", file=file, embed=embed)
 
     @cog_ext.cog_subcommand(
@@ -114,7 +124,10 @@ class TemplateCommand(commands.Cog):
             scope=template.scope,
         )
         await template_manager.update_template(template)
-        file, embed = await template_preview(template, self.bot, canvas, EMBED_COLOR)
+        progress_tracker.track(template, template.progress)
+        file, embed = await template_preview(
+            template, self.bot, canvas, EMBED_COLOR, render_cache
+        )
         await ctx.send(file=file, embed=embed)
 
     @cog_ext.cog_subcommand(
@@ -138,6 +151,7 @@ class TemplateCommand(commands.Cog):
         )
         if not success:
             raise UserError("Deletion failed. Please contact the bot developer.")
+        progress_tracker.untrack(canvas.code, name)
         embed = discord.Embed(
             title="Deleted!",
             description=f"Successfully deleted `{name}` from the tracker.",
@@ -167,24 +181,27 @@ class TemplateCommand(commands.Cog):
 
         scopes = ["private", "global", "faction"]
         templates: Dict[str, List[Template]] = {scope: [] for scope in scopes}
-        # Only fetch the metadata and not the image
-        template_generator = template_manager.get_templates(
-            no_image=True, canvas_code=canvas.code
-        )
-        async for template in template_generator:
-            if (
-                template.scope == "private"
-                and ctx.author_id == template.owner
-                and ctx.guild is None
-            ):  # In DMs
-                templates["private"].append(template)
-            elif template.scope == "faction" and ctx.guild_id == template.owner:
-                templates["faction"].append(template)
-            elif template.scope != "private":
+        # Only the metadata is needed, straight from the template catalog
+        if ctx.guild is None:  # In DMs
+            templates["private"] = await template_manager.list_templates(
+                canvas.code, scope="private", owner=ctx.author_id
+            )
+        else:
+            templates["faction"] = await template_manager.list_templates(
+                canvas.code, scope="faction", owner=ctx.guild_id
+            )
+        for template in await template_manager.list_templates(canvas.code):
+            if template.scope == "global" or (
+                template.scope == "faction" and template.owner != ctx.guild_id
+            ):
                 if template.name == "combo":  # Show combo first
                     templates["global"].insert(0, template)
                 else:
                     templates["global"].append(template)
+        for template in sum(templates.values(), []):
+            template.progress = (
+                progress_tracker.get(canvas.code, template.name) or template.progress
+            )
         if sort:
             templates = {
                 scope: sorted(temps, key=sorter, reverse=reverse_order)
@@ -212,7 +229,12 @@ class TemplateCommand(commands.Cog):
             raise UserError("Invalid template name.")
         if template.scope == "private" and ctx.author_id != template.owner:
             raise UserError("This template is private.")
-        file, embed = await template_preview(template, self.bot, canvas, EMBED_COLOR)
+        template.progress = (
+            progress_tracker.get(canvas.code, template.name) or template.progress
+        )
+        file, embed = await template_preview(
+            template, self.bot, canvas, EMBED_COLOR, render_cache
+        )
         await ctx.send(file=file, embed=embed)
 
     @staticmethod
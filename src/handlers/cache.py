@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    Run coroutines so that concurrent calls for the same key share a single run.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a coroutine function, or wait for the result of the running one
+        with the same key.
+
+        :param compute: A coroutine function computing the result.
+        """
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+        future = asyncio.get_event_loop().create_future()
+        self._pending[key] = future
+        try:
+            result = await compute()
+        except BaseException as error:
+            future.set_exception(error)
+            # Don't warn about never-retrieved exceptions when nobody was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._pending[key]
+
+
+class AsyncLRUCache:
+    """
+    A least-recently-used cache for the results of coroutines, bounded
+    by the total size of its values.
+
+    Concurrent requests for the same missing key share a single computation.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[Any], int] = len,
+    ):
+        """
+        :param max_size: The maximum total size of the cached values.
+        :param ttl: How long values stay valid, in seconds. If None, values never expire.
+        :param sizeof: A function returning the size of a value, in the same unit as max_size.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, size, expiry time)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._pending = SingleFlight()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        """
+        Get a cached value without computing it.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[2] < time.monotonic():
+            self.pop(key)
+            return default
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: Hashable, value):
+        """
+        Cache a value, evicting the least recently used ones if needed.
+        Values larger than the whole cache aren't stored.
+        """
+        self.pop(key)
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+        expiry = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (value, size, expiry)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def pop(self, key: Hashable):
+        """
+        Remove a value from the cache, if present.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        """
+        Remove every value from the cache.
+        """
+        self._entries.clear()
+        self.size = 0
+
+    async def get_or_compute(
+        self, key: Hashable, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Get a cached value, or compute and cache it if missing.
+        If the value is already being computed, wait for that computation instead.
+
+        :param compute: A coroutine function computing the value.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            self.hits += 1
+            return value
+        if key in self._pending:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        async def compute_and_cache():
+            value = await compute()
+            self.set(key, value)
+            return value
+
+        return await self._pending.run(key, compute_and_cache)
@@ -1,3 +1,5 @@
 from .database_connector import DatabaseConnector
+from .image_store import ImageStore
+from .template_catalog import TemplateCatalog
 from .template_manager import TemplateManager
 from .stats_manager import StatsManager
@@ -0,0 +1,169 @@
+import io
+import pickle
+import struct
+import zlib
+import numpy as np
+
+# File layout:
+#   magic (4 bytes) | version, layout, compression, ndim (1 byte each)
+#   | dtype string length (1 byte) | dtype string | shape (ndim little-endian uint32)
+#   | payload
+MAGIC = b"PCA\x00"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBBB")  # Up to the dtype string length
+
+# Payload layouts
+RAW = 0  # The array's bytes, in row-major order.
+RLE = 1  # uint64 run count | run values | uint32 run lengths
+SPARSE = 2  # fill value | uint64 count | uint32 positions | values
+
+# Payload compressions
+NONE = 0
+ZLIB = 1
+
+# Arrays smaller than this, in bytes, are stored raw and uncompressed.
+MIN_ENCODED_SIZE = 1024
+
+
+class ArrayFormatError(Exception):
+    """Raised when binary data isn't a valid encoded array."""
+
+
+def is_encoded_array(data: bytes) -> bool:
+    """
+    Check whether binary data was produced by encode_array.
+    """
+    return bytes(data[: len(MAGIC)]) == MAGIC
+
+
+def _rle(flat: np.ndarray) -> bytes:
+    starts = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.append(starts, flat.size)).astype("<u4")
+    values = flat[starts]
+    return struct.pack("<Q", len(starts)) + values.tobytes() + lengths.tobytes()
+
+
+def _unrle(payload: memoryview, dtype: np.dtype, size: int) -> np.ndarray:
+    (count,) = struct.unpack_from("<Q", payload)
+    offset = 8 + count * dtype.itemsize
+    values = np.frombuffer(payload, dtype, count, offset=8)
+    lengths = np.frombuffer(payload, "<u4", count, offset=offset)
+    if int(lengths.sum()) != size:
+        raise ArrayFormatError("Run lengths don't match the array size.")
+    return np.repeat(values, lengths)
+
+
+def _sparse(flat: np.ndarray, fill_value) -> bytes:
+    positions = np.flatnonzero(flat != fill_value).astype("<u4")
+    return (
+        np.array(fill_value, flat.dtype).tobytes()
+        + struct.pack("<Q", positions.size)
+        + positions.tobytes()
+        + flat[positions].tobytes()
+    )
+
+
+def _unsparse(payload: memoryview, dtype: np.dtype, size: int) -> np.ndarray:
+    fill_value = np.frombuffer(payload, dtype, 1)[0]
+    (count,) = struct.unpack_from("<Q", payload, dtype.itemsize)
+    offset = dtype.itemsize + 8
+    positions = np.frombuffer(payload, "<u4", count, offset=offset)
+    values = np.frombuffer(payload, dtype, count, offset=offset + 4 * count)
+    flat = np.full(size, fill_value, dtype)
+    flat[positions] = values
+    return flat
+
+
+def _decompress(payload: memoryview, compression: int) -> memoryview:
+    if compression == NONE:
+        return payload
+    if compression == ZLIB:
+        return memoryview(zlib.decompress(payload))
+    raise ArrayFormatError(f"Unknown compression: {compression}")
+
+
+def encode_array(array: np.ndarray, fill_value=None) -> bytes:
+    """
+    Encode an array to a compact, self-describing binary format.
+    Every layout is tried, compressed with zlib, and the smallest result is kept.
+    zlib is always used, so that any instance can decode the arrays.
+
+    :param fill_value: The array's background value, such as 255 for transparent
+    template pixels. If given, the positions and values of the other
+    elements are also tried as a layout.
+    """
+    array = np.ascontiguousarray(array)
+    if array.dtype.byteorder == ">":
+        array = array.astype(array.dtype.newbyteorder("<"))
+    flat = array.ravel()
+    layout, compression, payload = RAW, NONE, flat.tobytes()
+    if array.nbytes >= MIN_ENCODED_SIZE:
+        candidates = {RAW: payload, RLE: _rle(flat)}
+        if fill_value is not None:
+            candidates[SPARSE] = _sparse(flat, fill_value)
+        for candidate_layout, candidate in candidates.items():
+            compressed = zlib.compress(candidate, 6)
+            if len(compressed) < len(payload):
+                layout, compression, payload = candidate_layout, ZLIB, compressed
+    dtype = array.dtype.str.encode()
+    header = _HEADER.pack(MAGIC, VERSION, layout, compression, array.ndim, len(dtype))
+    shape = struct.pack(f"<{array.ndim}I", *array.shape)
+    return header + dtype + shape + payload
+
+
+def decode_array(data: bytes) -> np.ndarray:
+    """
+    Decode an array encoded with encode_array.
+    Uncompressed raw arrays are read-only views of data, without any copy.
+    """
+    data = memoryview(data)
+    if len(data) < _HEADER.size or not is_encoded_array(data):
+        raise ArrayFormatError("Not an encoded array.")
+    _, version, layout, compression, ndim, dtype_length = _HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ArrayFormatError(f"Unsupported array format version: {version}")
+    offset = _HEADER.size
+    dtype = np.dtype(bytes(data[offset : offset + dtype_length]).decode())
+    offset += dtype_length
+    shape = struct.unpack_from(f"<{ndim}I", data, offset)
+    offset += 4 * ndim
+    size = int(np.prod(shape, dtype=np.int64))
+    payload = _decompress(data[offset:], compression)
+    if layout == RAW:
+        flat = np.frombuffer(payload, dtype, size)
+    elif layout == RLE:
+        flat = _unrle(payload, dtype, size)
+    elif layout == SPARSE:
+        flat = _unsparse(payload, dtype, size)
+    else:
+        raise ArrayFormatError(f"Unknown array layout: {layout}")
+    return flat.reshape(shape)
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """
+    An unpickler only able to load numpy arrays, for legacy documents.
+    """
+
+    ALLOWED = {
+        ("numpy.core.multiarray", "_reconstruct"),
+        ("numpy._core.multiarray", "_reconstruct"),
+        ("numpy", "ndarray"),
+        ("numpy", "dtype"),
+        # Protocol 2 stores bytes as latin-1 strings.
+        ("_codecs", "encode"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self.ALLOWED:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed.")
+        return super().find_class(module, name)
+
+
+def load_legacy_array(data: bytes) -> np.ndarray:
+    """
+    Load an array stored by pickle in older versions of the bot.
+    Only numpy arrays can be loaded, other objects raise pickle.UnpicklingError.
+    """
+    return _ArrayUnpickler(io.BytesIO(data)).load()
@@ -1,7 +1,8 @@
-import pickle
 from typing import AsyncGenerator
+import numpy as np
 from bson.binary import Binary
 from motor.motor_asyncio import AsyncIOMotorClient
+from .array_codec import encode_array, decode_array, is_encoded_array, load_legacy_array
 
 
 class DatabaseConnector:
@@ -19,14 +20,23 @@ class DatabaseConnector:
         self.collection = mongo_client.pycharity[collection_name]
 
     @staticmethod
-    def _serialize(data) -> Binary:
-        """Convert a python object to a binary blob."""
-        return Binary(pickle.dumps(data, protocol=2), subtype=128)
+    def _serialize(array: np.ndarray, fill_value=None) -> Binary:
+        """
+        Convert a numpy array to a binary blob.
+
+        :param fill_value: The array's background value, allowing a sparse encoding.
+        """
+        return Binary(encode_array(array, fill_value), subtype=128)
 
     @staticmethod
-    def _deserialize(data: Binary):
-        """Retrieve a python object from a binary blob."""
-        return pickle.loads(data)
+    def _deserialize(data: Binary) -> np.ndarray:
+        """
+        Retrieve a numpy array from a binary blob.
+        Arrays pickled by older versions are still read.
+        """
+        if is_encoded_array(data):
+            return decode_array(data)
+        return load_legacy_array(data)
 
     # pylint: disable = dangerous-default-value
     async def find(self, projection={}, **query) -> AsyncGenerator[dict, None]:
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Optional
+import numpy as np
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .database_connector import DatabaseConnector
+
+
+class ImageStore(DatabaseConnector):
+    """
+    A content-addressed store of template images, keyed by the hash of their content.
+    Identical images are stored once, and deleted when no template references them.
+    """
+
+    def __init__(self, mongo_uri: str):
+        """
+        :param mongo_uri: The mongodb's uri, ie: mongodb://127.0.0.1:27017/
+        """
+        super().__init__(mongo_uri, "images")
+
+    async def acquire(self, image_hash: str, image: np.ndarray):
+        """
+        Add a reference to an image, storing it if it isn't stored yet.
+        The image is only encoded if it isn't already in the store.
+
+        :param image_hash: The hash of the image content.
+        """
+        while True:
+            result = await self.collection.update_one(
+                {"_id": image_hash}, {"$inc": {"refs": 1}}
+            )
+            if result.matched_count > 0:
+                return
+            document = {
+                "_id": image_hash,
+                "image": self._serialize(image, fill_value=255),
+                "refs": 1,
+            }
+            try:
+                await self.collection.insert_one(document)
+                return
+            except DuplicateKeyError:
+                # Stored concurrently, add a reference to it instead.
+                continue
+
+    async def release(self, image_hash: Optional[str]):
+        """
+        Remove a reference to an image, deleting it once it isn't referenced anymore.
+        """
+        if image_hash is None:
+            return
+        document = await self.collection.find_one_and_update(
+            {"_id": image_hash},
+            {"$inc": {"refs": -1}},
+            projection={"refs": True},
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is not None and document["refs"] <= 0:
+            await self.collection.delete_one({"_id": image_hash, "refs": {"$lte": 0}})
+
+    async def get(self, image_hash: str) -> Optional[np.ndarray]:
+        """
+        Get an image by hash, or None if it isn't stored.
+        """
+        document = await self.collection.find_one({"_id": image_hash})
+        if document is None:
+            return None
+        return self._deserialize(document["image"])
+
+    async def get_many(self, image_hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Get several images by hash with a single query.
+
+        :return: The stored images, by hash. Missing images are left out.
+        """
+        images = {}
+        query = {"_id": {"$in": list(image_hashes)}}
+        async for document in self.collection.find(query):
+            images[document["_id"]] = self._deserialize(document["image"])
+        return images
@@ -0,0 +1,97 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+from handlers.pxls import Template
+
+
+class TemplateCatalog:
+    """
+    An in-memory copy of the metadata of every template of a canvas,
+    indexed by name, owner and scope.
+
+    Templates in the catalog have no image, only their image hash.
+    """
+
+    def __init__(self):
+        # canvas code -> template name -> template
+        self._templates: Dict[str, Dict[str, Template]] = {}
+        # canvas code -> owner or scope -> template names, as ordered sets
+        self._by_owner: Dict[str, Dict[int, Dict[str, None]]] = {}
+        self._by_scope: Dict[str, Dict[str, Dict[str, None]]] = {}
+        # document id -> (canvas code, template name)
+        self._ids: Dict[Hashable, Tuple[str, str]] = {}
+
+    def is_loaded(self, canvas_code: str) -> bool:
+        """
+        Check whether the templates of a canvas were loaded.
+        """
+        return canvas_code in self._templates
+
+    def load(self, canvas_code: str, templates: List[Tuple[Hashable, Template]]):
+        """
+        Replace the templates of a canvas.
+
+        :param templates: (document id, template) pairs.
+        """
+        for doc_id, (code, _) in list(self._ids.items()):
+            if code == canvas_code:
+                del self._ids[doc_id]
+        self._templates[canvas_code] = {}
+        self._by_owner[canvas_code] = {}
+        self._by_scope[canvas_code] = {}
+        for doc_id, template in templates:
+            self.put(template, doc_id)
+
+    def put(self, template: Template, doc_id: Optional[Hashable] = None):
+        """
+        Add or replace a template, if its canvas is loaded.
+
+        :param doc_id: The id of the template's document, used to apply deletions
+        received from change streams.
+        """
+        code = template.canvas_code
+        if not self.is_loaded(code):
+            return
+        self.remove(code, template.name)
+        self._templates[code][template.name] = template
+        self._by_owner[code].setdefault(template.owner, {})[template.name] = None
+        self._by_scope[code].setdefault(template.scope, {})[template.name] = None
+        if doc_id is not None:
+            self._ids[doc_id] = (code, template.name)
+
+    def remove(self, canvas_code: str, name: str):
+        """
+        Remove a template, if present.
+        """
+        template = self._templates.get(canvas_code, {}).pop(name, None)
+        if template is None:
+            return
+        self._by_owner[canvas_code][template.owner].pop(name, None)
+        self._by_scope[canvas_code][template.scope].pop(name, None)
+
+    def remove_id(self, doc_id: Hashable):
+        """
+        Remove the template stored in a given document, if known.
+        """
+        location = self._ids.pop(doc_id, None)
+        if location is not None:
+            self.remove(*location)
+
+    def get(self, canvas_code: str, name: str) -> Optional[Template]:
+        """
+        Get a template by name.
+        """
+        return self._templates.get(canvas_code, {}).get(name)
+
+    def find(
+        self, canvas_code: str, scope: Optional[str] = None, owner: Optional[int] = None
+    ) -> List[Template]:
+        """
+        Get the templates of a canvas, optionally filtered by scope and owner.
+        """
+        templates = self._templates.get(canvas_code, {})
+        names = templates.keys()
+        if scope is not None:
+            names = self._by_scope.get(canvas_code, {}).get(scope, {}).keys()
+        if owner is not None:
+            owned = self._by_owner.get(canvas_code, {}).get(owner, {})
+            names = [name for name in names if name in owned]
+        return [templates[name] for name in names]
@@ -1,27 +1,191 @@
-from typing import AsyncGenerator
+import asyncio
+import logging
+from typing import AsyncGenerator, Dict, Iterable, List, Optional
+import numpy as np
+from pymongo.errors import PyMongoError
+from handlers.cache import AsyncLRUCache
+from handlers.image import array_hash
 from handlers.pxls import Template, Progress
-from handlers.database import DatabaseConnector
+from handlers.database import DatabaseConnector, ImageStore, TemplateCatalog
+
+logger = logging.getLogger("pyCharity." + __name__)
 
 
 class TemplateManager(DatabaseConnector):
     """
     An helper used to ease interactions with the templates stored
     in the mongodb databse.
+
+    Template images are kept in a separate ImageStore, templates only
+    storing the hash of their image. Decoded images are cached in memory,
+    so loading a template whose image is cached only reads its metadata.
+
+    The metadata of every template of a canvas is mirrored in a TemplateCatalog,
+    kept up to date by every write made through the manager, and optionally
+    by mongodb change streams. Lookups by name and canvas are answered from it.
     """
 
-    def __init__(self, mongo_uri: str):
+    def __init__(self, mongo_uri: str, image_cache_size: int = 256 * 1024 * 1024):
         """
         :param mongo_uri: The mongodb's uri, ie: mongodb://127.0.0.1:27017/
+        :param image_cache_size: The memory used to cache decoded images, in bytes.
         """
         super().__init__(mongo_uri, "templates")
+        self.images = ImageStore(mongo_uri)
+        self._image_cache = AsyncLRUCache(
+            max_size=image_cache_size, sizeof=lambda image: image.nbytes
+        )
+        self.catalog = TemplateCatalog()
+        self._catalog_lock = asyncio.Lock()
+
+    async def _load_catalog(self, canvas_code: str):
+        """
+        Load the metadata of a canvas' templates in the catalog, if not loaded yet.
+        """
+        if self.catalog.is_loaded(canvas_code):
+            return
+        async with self._catalog_lock:
+            if self.catalog.is_loaded(canvas_code):
+                return
+            legacy = self.collection.find(
+                {"canvas_code": canvas_code, "image": {"$exists": True}}
+            )
+            async for document in legacy:
+                await self._migrate_image(document)
+            entries = []
+            documents = super().find(
+                projection={"image": False}, canvas_code=canvas_code
+            )
+            async for document in documents:
+                template = self._doc2template(document)
+                entries.append((document["_id"], template))
+            self.catalog.load(canvas_code, entries)
+
+    def _copy_template(self, template: Template, array=None) -> Template:
+        """
+        Copy a catalog template, so that callers can't alter the catalog.
+
+        :param array: The image of the copy. If None, the copy has no image.
+        """
+        return self._doc2template(self._template2doc(template), array)
+
+    async def list_templates(
+        self,
+        canvas_code: str,
+        scope: Optional[str] = None,
+        owner: Optional[int] = None,
+        no_image=True,
+    ) -> List[Template]:
+        """
+        Get the templates of a canvas from the catalog,
+        optionally filtered by scope and owner.
 
-    def _doc2template(self, document) -> Template:
+        :param no_image: If set to False, also retrieve the images.
+        """
+        await self._load_catalog(canvas_code)
+        found = self.catalog.find(canvas_code, scope, owner)
+        if no_image:
+            return [self._copy_template(template) for template in found]
+        images = await self._get_images(template.image_hash for template in found)
+        return [
+            self._copy_template(template, images[template.image_hash])
+            for template in found
+        ]
+
+    async def watch_changes(self):
+        """
+        Keep the catalog up to date with changes made to the database by other
+        processes, using change streams. Needs mongodb to run as a replica set.
+        """
+        try:
+            async with self.collection.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    await self._apply_change(change)
+        except PyMongoError as error:
+            logger.warning(f"Stopped watching template changes: {error}")
+
+    async def _apply_change(self, change: dict):
+        """
+        Apply a change stream event to the catalog.
+        """
+        if change["operationType"] == "delete":
+            self.catalog.remove_id(change["documentKey"]["_id"])
+            return
+        document = change.get("fullDocument")
+        if document is None or "image_hash" not in document:
+            return
+        template = self._doc2template(document)
+        self.catalog.put(template, document["_id"])
+
+    async def _get_image(self, image_hash: str) -> np.ndarray:
+        """
+        Get a read-only image by hash, from the cache if possible.
+        """
+
+        async def load():
+            image = await self.images.get(image_hash)
+            if image is None:
+                raise ValueError(f"Image {image_hash} is missing from the store.")
+            image.flags.writeable = False
+            return image
+
+        return await self._image_cache.get_or_compute(image_hash, load)
+
+    async def _get_images(self, image_hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Get several read-only images by hash, loading the ones
+        missing from the cache with a single query.
+        """
+        images = {}
+        missing = []
+        for image_hash in set(image_hashes):
+            image = self._image_cache.get(image_hash)
+            if image is None:
+                missing.append(image_hash)
+            else:
+                images[image_hash] = image
+        if len(missing) == 0:
+            return images
+        loaded = await self.images.get_many(missing)
+        for image_hash in missing:
+            image = loaded.get(image_hash)
+            if image is None:
+                raise ValueError(f"Image {image_hash} is missing from the store.")
+            image.flags.writeable = False
+            self._image_cache.set(image_hash, image)
+            images[image_hash] = image
+        return images
+
+    def _cache_image(self, template: Template):
+        """
+        Cache the image of a template being written.
+        """
+        image = np.asarray(template.image)
+        if image.flags.writeable:
+            image = image.copy()
+            image.flags.writeable = False
+        self._image_cache.set(template.image_hash, image)
+
+    async def _load_template(self, document, no_image=False) -> Template:
+        """
+        Convert a document to a Template, retrieving its image.
+
+        :param no_image: If set to True, do not retrieve the image.
+        """
+        if no_image or "image_hash" not in document:
+            return self._doc2template(document)
+        array = await self._get_image(document["image_hash"])
+        return self._doc2template(document, array)
+
+    @staticmethod
+    def _doc2template(document, array=None) -> Template:
         """
         Convert a document to a Template.
+
+        :param array: The template's image. If None, the template has no image.
         """
-        array = self._deserialize(document["image"]) if "image" in document else []
         return Template(
-            array=array,
+            array=[] if array is None else array,
             ox=document["ox"],
             oy=document["oy"],
             name=document["name"],
@@ -30,6 +194,7 @@ class TemplateManager(DatabaseConnector):
             owner=document["owner"],
             scope=document["scope"],
             progress=Progress(**document["progress"]),
+            image_hash=document.get("image_hash"),
         )
 
     def _template2doc(self, template: Template) -> dict:
@@ -44,34 +209,77 @@ class TemplateManager(DatabaseConnector):
             "ox": template.ox,
             "oy": template.oy,
             "url": template.url,
-            "image": self._serialize(template.image),
+            "image_hash": template.image_hash,
             "progress": template.progress.to_dict(),
         }
         return data
 
+    async def _migrate_image(self, document):
+        """
+        Move an image stored inside a template document by older versions,
+        possibly pickled, to the image store.
+        """
+        if "image" not in document:
+            return
+        image = self._deserialize(document["image"])
+        image_hash = array_hash(image)
+        await self.images.acquire(image_hash, image)
+        await self.collection.update_one(
+            {"_id": document["_id"]},
+            {"$set": {"image_hash": image_hash}, "$unset": {"image": ""}},
+        )
+        document["image_hash"] = image_hash
+
     async def add_template(self, template: Template):
         """
         Add a template to the database.
         """
         data = self._template2doc(template)
-        await self.collection.insert_one(data)
+        await self.images.acquire(template.image_hash, template.image)
+        result = await self.collection.insert_one(data)
+        self._cache_image(template)
+        self.catalog.put(self._copy_template(template), result.inserted_id)
 
     async def update_template(self, template: Template, data=None):
         """
         Update a template from the database.
+        The image is only written if it changed.
 
         :param data: A dictionary of fields to update. If set to None, updates all fields.
         """
+        query = {"name": template.name, "canvas_code": template.canvas_code}
         if data is None:
             data = self._template2doc(template)
-        await self.collection.update_one(
-            {"name": template.name, "canvas_code": template.canvas_code}, {"$set": data}
-        )
+        if "image_hash" in data:
+            previous = await self.collection.find_one(query, {"image_hash": True})
+            previous_hash = previous.get("image_hash") if previous else None
+            if data["image_hash"] != previous_hash:
+                await self.images.acquire(data["image_hash"], template.image)
+                await self.collection.update_one(query, {"$set": data})
+                await self.images.release(previous_hash)
+                self._cache_image(template)
+                self._update_catalog(template, data)
+                return
+        await self.collection.update_one(query, {"$set": data})
+        self._update_catalog(template, data)
+
+    def _update_catalog(self, template: Template, data: dict):
+        """
+        Apply an update to the catalog's copy of a template.
+        """
+        entry = self.catalog.get(template.canvas_code, template.name)
+        if entry is None:
+            return
+        document = {**self._template2doc(entry), **data}
+        self.catalog.put(self._doc2template(document))
 
     async def check_name_exists(self, name, **query):
         """
         Check if a template name already exists.
         """
+        if set(query) == {"canvas_code"}:
+            await self._load_catalog(query["canvas_code"])
+            return self.catalog.get(query["canvas_code"], name) is not None
         query["name"] = name
         if await self.collection.find_one(query, {"image": False}):
             return True
@@ -86,11 +294,19 @@ class TemplateManager(DatabaseConnector):
         for decreased memory usage. The returned template will
         have an empty list as the image attribute instead.
         """
+        if set(query) == {"name", "canvas_code"}:
+            await self._load_catalog(query["canvas_code"])
+            entry = self.catalog.get(query["canvas_code"], query["name"])
+            if entry is None:
+                return None
+            array = None if no_image else await self._get_image(entry.image_hash)
+            return self._copy_template(entry, array)
         projection = {"image": False} if no_image else None
         document = await super().find_one(projection=projection, **query)
         if document is None:
             return None
-        return self._doc2template(document)
+        await self._migrate_image(document)
+        return await self._load_template(document, no_image)
 
     async def get_templates(
         self, no_image=False, **query
@@ -102,13 +318,27 @@ class TemplateManager(DatabaseConnector):
         for decreased memory usage. The returned template will
         have an empty list as the image attribute instead.
         """
+        if set(query) == {"canvas_code"}:
+            for template in await self.list_templates(
+                query["canvas_code"], no_image=no_image
+            ):
+                yield template
+            return
         projection = {"image": False} if no_image else None
         async for document in super().find(projection=projection, **query):
-            yield self._doc2template(document)
+            await self._migrate_image(document)
+            yield await self._load_template(document, no_image)
 
     async def delete_template(self, **query):
         """
         Delete a template from the database.
         """
-        result = await self.collection.delete_one(query)
-        return result.deleted_count > 0
+        document = await self.collection.find_one_and_delete(
+            query, projection={"image_hash": True, "name": True, "canvas_code": True}
+        )
+        if document is None:
+            return False
+        self.catalog.remove_id(document["_id"])
+        self.catalog.remove(document["canvas_code"], document["name"])
+        await self.images.release(document.get("image_hash"))
+        return True
@@ -7,16 +7,9 @@ from discord_slash.utils import manage_components
 from discord_slash.model import ButtonStyle
 import numpy as np
 from aiocache import cached
-from handlers.image import image2buffer
+from handlers.image import image2buffer, palettized2buffer
 from handlers.pxls.template import Template
-
-
-class UserError(Exception):
-    """
-    Exception used to notify the user of an error.
-    Will be caught by the error handler and broadcasted
-    back at them as a message.
-    """
+from handlers.errors import UserError  # pylint: disable = unused-import
 
 
 def attach_image(
@@ -57,9 +50,11 @@ async def get_owner_name(scope, owner_id, bot):
     return owner_name
 
 
-async def template_preview(template, bot, canvas, embed_color):
+async def template_preview(template, bot, canvas, embed_color, render_cache=None):
     """
     Generate an template preview embed.
+
+    :param render_cache: An optional RenderCache the preview image is cached in.
     """
     owner_name = await get_owner_name(template.scope, template.owner, bot)
     embed = discord.Embed(
@@ -68,7 +63,12 @@ async def template_preview(template, bot, canvas, embed_color):
         color=embed_color,
         url=template.url,
     )
-    template_img = await template.render(canvas.palette)
+    if render_cache is None:
+        template_img = await palettized2buffer(template, canvas.palette)
+    else:
+        template_img = await render_cache.png(
+            template, canvas.palette, key=("template", template.content_hash)
+        )
     file = attach_image(template_img, embed)
     return file, embed
 
@@ -0,0 +1,6 @@
+class UserError(Exception):
+    """
+    Exception used to notify the user of an error.
+    Will be caught by the error handler and broadcasted
+    back at them as a message.
+    """
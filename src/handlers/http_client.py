@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import aiohttp
+import orjson
+from aioify import aioify
+from handlers.cache import SingleFlight
+
+logger = logging.getLogger("pyCharity." + __name__)
+
+# Response codes worth retrying a GET request for.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Json payloads larger than this are decoded outside of the event loop, in bytes.
+LARGE_PAYLOAD = 1 << 20
+
+# Maximum number of endpoints with their own statistics. Requests to
+# any other endpoint are grouped under OTHER_ENDPOINTS.
+MAX_ENDPOINTS = 32
+OTHER_ENDPOINTS = "other"
+
+
+class BadResponseError(Exception):
+    """Raised when response code isn't 200."""
+
+
+class EndpointStats:
+    """
+    Latency statistics of the requests sent to an endpoint.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, latency: float, error: bool):
+        """
+        Record a request.
+
+        :param latency: The duration of the request, in seconds.
+        :param error: Whether the request failed.
+        """
+        self.requests += 1
+        self.errors += error
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def report(self) -> Dict[str, float]:
+        """
+        Get the statistics, with latencies in milliseconds.
+        """
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean_latency_ms": 1000 * self.total_latency / max(self.requests, 1),
+            "max_latency_ms": 1000 * self.max_latency,
+        }
+
+
+class HttpClient:
+    """
+    A long-lived HTTP client sharing a pool of keep-alive connections
+    between every request, with timeouts and retries on transient errors.
+
+    The underlying session is created on first use, and must be closed
+    with close() on shutdown.
+    """
+
+    def __init__(
+        self,
+        limit_per_host: int = 8,
+        total_timeout: float = 60,
+        read_timeout: float = 20,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        """
+        :param limit_per_host: The maximum number of simultaneous connections to a host.
+        :param total_timeout: The maximum duration of a request, in seconds.
+        :param read_timeout: The maximum time between two reads, in seconds.
+        :param retries: The number of times a failed GET request is retried.
+        :param backoff: The base delay between two attempts, in seconds.
+        """
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout, sock_read=read_timeout
+        )
+        self.retries = retries
+        self.backoff = backoff
+        self.stats: Dict[str, EndpointStats] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        # url -> (ETag, Last-Modified, content) of the last conditional fetch
+        self._validators: Dict[str, Tuple[Optional[str], Optional[str], Any]] = {}
+        self._inflight = SingleFlight()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared session, creating it if needed.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=300,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Close the pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _endpoint_stats(self, url: str, endpoint: Optional[str]) -> EndpointStats:
+        """
+        Get the statistics of an endpoint, identified by a label or by the url's host.
+        """
+        if endpoint is None:
+            endpoint = urlsplit(url).netloc
+        if endpoint not in self.stats and len(self.stats) >= MAX_ENDPOINTS:
+            endpoint = OTHER_ENDPOINTS
+        if endpoint not in self.stats:
+            self.stats[endpoint] = EndpointStats()
+        return self.stats[endpoint]
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the latency statistics of every endpoint queried so far.
+        """
+        return {endpoint: stats.report() for endpoint, stats in self.stats.items()}
+
+    async def _wait_before_retry(self, attempt: int, stats: EndpointStats):
+        stats.retries += 1
+        delay = self.backoff * 2**attempt
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    @asynccontextmanager
+    async def get(
+        self,
+        url: str,
+        allow_not_modified: bool = False,
+        endpoint: Optional[str] = None,
+        **kwargs,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Send a GET request, retrying on connection errors, timeouts and
+        transient error codes, and yield the response.
+        Errors raised once the response has been yielded aren't retried.
+
+        :param allow_not_modified: Whether 304 responses are yielded, for conditional requests.
+        :param endpoint: A label to group the request's statistics under,
+        defaults to the url's host.
+        :raise BadResponseError: If the response code isn't 200 (or 304, if allowed).
+        """
+        stats = self._endpoint_stats(url, endpoint)
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self.session.get(url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                stats.record(time.perf_counter() - start, error=True)
+                if attempt == self.retries:
+                    raise
+                logger.debug(f"GET {url} failed ({error!r}), retrying.")
+                await self._wait_before_retry(attempt, stats)
+                continue
+            async with response:
+                if response.status in RETRY_STATUSES and attempt < self.retries:
+                    stats.record(time.perf_counter() - start, error=True)
+                    logger.debug(f"GET {url} returned {response.status}, retrying.")
+                    await self._wait_before_retry(attempt, stats)
+                    continue
+                not_modified = allow_not_modified and response.status == 304
+                if response.status != 200 and not not_modified:
+                    stats.record(time.perf_counter() - start, error=True)
+                    raise BadResponseError(f"Query returned {response.status} code.")
+                try:
+                    yield response
+                finally:
+                    stats.record(time.perf_counter() - start, error=False)
+                return
+
+    async def fetch(
+        self,
+        url: str,
+        content_type: str = "json",
+        conditional: bool = False,
+        endpoint: Optional[str] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Get the content of a url. Identical concurrent fetches share a single request.
+
+        :param content_type: 'json' or 'binary'
+        :param conditional: Whether to send the ETag and Last-Modified validators of
+        the previous response, so that unchanged content isn't downloaded again.
+        :param endpoint: A label to group the request's statistics under,
+        defaults to the url's host.
+        :return: The content, and whether it changed since the previous conditional fetch.
+        """
+        return await self._inflight.run(
+            (url, content_type, conditional),
+            lambda: self._fetch(url, content_type, conditional, endpoint),
+        )
+
+    async def _fetch(
+        self, url: str, content_type: str, conditional: bool, endpoint: Optional[str]
+    ) -> Tuple[Any, bool]:
+        headers = {}
+        etag, last_modified, content = self._validators.get(url, (None, None, None))
+        if conditional:
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+        async with self.get(
+            url, allow_not_modified=bool(headers), endpoint=endpoint, headers=headers
+        ) as response:
+            if response.status == 304:
+                return content, False
+            body = await response.read()
+            if conditional:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        if content_type == "json":
+            if len(body) > LARGE_PAYLOAD:
+                content = await aioify(orjson.loads)(body)
+            else:
+                content = orjson.loads(body)
+        elif content_type == "binary":
+            content = body
+        else:
+            raise ValueError(f"Unknown content type: {content_type}")
+        if conditional and (etag is not None or last_modified is not None):
+            self._validators[url] = (etag, last_modified, content)
+        return content, True
+
+    async def post(self, url: str, endpoint: Optional[str] = None, **kwargs) -> Any:
+        """
+        Send a POST request and return the json content of the response.
+        POST requests are never retried.
+
+        :param endpoint: A label to group the request's statistics under,
+        defaults to the url's host.
+        :raise BadResponseError: If the response code isn't 200.
+        """
+        stats = self._endpoint_stats(url, endpoint)
+        start = time.perf_counter()
+        try:
+            response = await self.session.post(url, **kwargs)
+            async with response:
+                if response.status != 200:
+                    raise BadResponseError(f"Query returned {response.status} code.")
+                content = await response.json()
+        except Exception:
+            stats.record(time.perf_counter() - start, error=True)
+            raise
+        stats.record(time.perf_counter() - start, error=False)
+        return content
+
+
+http_client = HttpClient()
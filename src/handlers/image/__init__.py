@@ -1,2 +1,4 @@
 from .palettized_image import PalettizedImage
 from .utils import *
+from .palette import palette_hash, palette_lut, palette_array, quantize
+from .render_cache import RenderCache
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+import numpy as np
+
+# Pixels with an alpha value below this threshold are mapped to transparency.
+ALPHA_THRESHOLD = 128
+
+# Above this number of distinct colors missing from the palette, nearest colors
+# are found using a lookup table rather than by computing distances directly.
+MAX_DIRECT_MATCHES = 4096
+
+# Maximum number of palettes whose lookup tables are kept in memory.
+MAX_CACHED_PALETTES = 2
+
+_luts: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_luts_lock = threading.Lock()
+
+
+def palette_hash(palette) -> str:
+    """
+    Get a short string identifying a palette.
+    """
+    data = np.asarray(palette, dtype=np.uint8).tobytes()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def palette_array(palette) -> np.ndarray:
+    """
+    Get a read-only 256x4 array mapping palette indexes to rgba colors.
+    Index 255 and indexes not in the palette are mapped to (0, 0, 0, 0).
+    """
+    return _palette_array(tuple(map(tuple, palette)))
+
+
+@lru_cache(maxsize=16)
+def _palette_array(palette: Tuple[Tuple[int, ...], ...]) -> np.ndarray:
+    colors = np.zeros((256, 4), dtype=np.uint8)
+    colors[: len(palette)] = palette
+    colors[255] = (0, 0, 0, 0)
+    colors.flags.writeable = False
+    return colors
+
+
+def nearest_colors(rgb: np.ndarray, palette) -> np.ndarray:
+    """
+    Get the index of the nearest palette color for each row of a (n, 3) rgb array.
+    """
+    colors = np.asarray(palette, dtype=np.int32)[:, :3]
+    rgb = rgb.astype(np.int32)
+    best_match_idx = np.zeros(len(rgb), dtype=np.uint8)
+    best_match_dist = np.full(len(rgb), np.iinfo(np.int32).max, dtype=np.int32)
+    for idx, color in enumerate(colors):
+        color_distance = np.square(rgb - color).sum(axis=-1)
+        closer_mask = color_distance < best_match_dist
+        best_match_dist[closer_mask] = color_distance[closer_mask]
+        best_match_idx[closer_mask] = idx
+    return best_match_idx
+
+
+def _build_lut(palette) -> np.ndarray:
+    """
+    Map every packed 24-bit rgb value to the index of its nearest palette color.
+    """
+    colors = np.asarray(palette, dtype=np.int32)[:, :3]
+    values = np.arange(256, dtype=np.int32)[:, np.newaxis]
+    # Squared distance along each channel, for every channel value and palette color.
+    red, green, blue = (np.square(values - colors[:, c]) for c in range(3))
+    green_blue = (green[:, np.newaxis, :] + blue[np.newaxis, :, :]).reshape(
+        -1, len(colors)
+    )
+    distances = np.empty_like(green_blue)
+    lut = np.empty(1 << 24, dtype=np.uint8)
+    for red_value in range(256):
+        np.add(green_blue, red[red_value], out=distances)
+        lut[red_value << 16 : (red_value + 1) << 16] = distances.argmin(axis=1)
+    return lut
+
+
+def palette_lut(palette) -> np.ndarray:
+    """
+    Get the lookup table mapping packed 24-bit rgb values to the index of their
+    nearest palette color. Tables are built on first use, which takes about
+    a second, and cached by palette hash.
+    """
+    key = palette_hash(palette)
+    with _luts_lock:
+        if key in _luts:
+            _luts.move_to_end(key)
+        else:
+            _luts[key] = _build_lut(palette)
+            if len(_luts) > MAX_CACHED_PALETTES:
+                _luts.popitem(last=False)
+        return _luts[key]
+
+
+def _pack(image: np.ndarray) -> np.ndarray:
+    """
+    Pack the rgb channels of an image into 24-bit integers.
+    """
+    packed = image[..., 0].astype(np.uint32) << 16
+    packed |= image[..., 1].astype(np.uint32) << 8
+    packed |= image[..., 2]
+    return packed
+
+
+def _map_colors(colors: np.ndarray, palette) -> np.ndarray:
+    """
+    Map packed rgb colors to the index of their nearest palette color.
+    Colors already in the palette are matched exactly, without computing distances.
+    """
+    palette_colors = _pack(np.asarray(palette, dtype=np.uint8))
+    order = np.argsort(palette_colors, kind="stable")
+    positions = np.searchsorted(palette_colors[order], colors)
+    positions = positions.clip(max=len(order) - 1)
+    exact = palette_colors[order][positions] == colors
+    result = np.empty(len(colors), dtype=np.uint8)
+    result[exact] = order[positions[exact]]
+    if not exact.all():
+        missing = colors[~exact]
+        if len(missing) <= MAX_DIRECT_MATCHES:
+            rgb = np.stack(
+                [(missing >> 16) & 255, (missing >> 8) & 255, missing & 255], axis=-1
+            )
+            result[~exact] = nearest_colors(rgb, palette)
+        else:
+            result[~exact] = palette_lut(palette)[missing]
+    return result
+
+
+def quantize(image: np.ndarray, palette) -> np.ndarray:
+    """
+    Convert a rgb or rgba image to an array of palette indexes.
+    Colors that aren't in the palette are mapped to their nearest equivalent,
+    and pixels with an alpha value below ALPHA_THRESHOLD to 255 (transparent).
+
+    Matches are only computed once for each distinct color in the image.
+    """
+    packed = _pack(image)
+    transparent_code = 1 << 24  # Can't collide with a 24-bit color
+    if image.shape[-1] == 4:
+        packed[image[..., 3] < ALPHA_THRESHOLD] = transparent_code
+    colors, inverse = np.unique(packed.ravel(), return_inverse=True)
+    mapped = np.full(len(colors), 255, dtype=np.uint8)
+    opaque = colors != transparent_code
+    mapped[opaque] = _map_colors(colors[opaque], palette)
+    return mapped[inverse].reshape(packed.shape)
@@ -1,5 +1,7 @@
+from typing import Optional, Tuple
 import numpy as np
 from aioify import aioify
+from .palette import palette_array
 
 
 class PalettizedImage:
@@ -12,18 +14,43 @@ class PalettizedImage:
         self.image = array
 
     @aioify
-    def render(self, palette: list) -> np.ndarray:
+    def render(
+        self,
+        palette: list,
+        out: Optional[np.ndarray] = None,
+        crop: Optional[Tuple[int, int, int, int]] = None,
+        scale: int = 1,
+    ) -> np.ndarray:
         """
         Convert the quantized image to a rgba image array.
         Any color index present in the palettized image but \
         not referenced in the array will be mapped to (0,0,0,0).
 
         :param palette: The palette used to render.
+        :param out: An optional uint8 array of shape (height, width, 4)
+        to render into, sized after cropping and scaling.
+        :param crop: An optional (x, y, width, height) region to render.
+        :param scale: An integer upscaling factor.
         """
-        colors_dict = dict(enumerate(palette))
-        colors_dict[255] = (0, 0, 0, 0)
-        img = np.stack(np.vectorize(colors_dict.get)(self.image), axis=-1)
-        return img.astype(np.uint8)
+        image = self.region(crop, scale)
+        return np.take(palette_array(palette), image, axis=0, out=out, mode="clip")
+
+    def region(
+        self, crop: Optional[Tuple[int, int, int, int]] = None, scale: int = 1
+    ) -> np.ndarray:
+        """
+        Get the color indexes of a region of the image, upscaled by an integer factor.
+
+        :param crop: An optional (x, y, width, height) region.
+        :param scale: An integer upscaling factor.
+        """
+        image = self.image
+        if crop is not None:
+            x, y, width, height = crop
+            image = image[y : y + height, x : x + width]
+        if scale > 1:
+            image = np.repeat(np.repeat(image, scale, axis=0), scale, axis=1)
+        return image
 
     @property
     def width(self):
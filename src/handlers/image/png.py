@@ -0,0 +1,44 @@
+import struct
+import zlib
+import numpy as np
+from .palette import palette_array
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Build a PNG chunk: length, type, data and CRC.
+    """
+    crc = zlib.crc32(chunk_type + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def encode_indexed_png(
+    image: np.ndarray, palette: list, compression_level: int = 6
+) -> bytes:
+    """
+    Encode an array of palette indexes as an 8-bit paletted PNG.
+    Index 255 and indexes not in the palette are transparent, through a tRNS chunk.
+
+    :param compression_level: The zlib compression level, from 0 to 9.
+    """
+    height, width = image.shape
+    colors = palette_array(palette)
+    # The palette must cover every index used in the image.
+    entries = int(image.max()) + 1 if image.size > 0 else 1
+    alphas = colors[:entries, 3]
+    translucent = np.flatnonzero(alphas != 255)
+    header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+    # Each scanline starts with its filter type, 0 (none) being best for paletted images.
+    scanlines = np.zeros((height, width + 1), dtype=np.uint8)
+    scanlines[:, 1:] = image
+    chunks = [
+        _chunk(b"IHDR", header),
+        _chunk(b"PLTE", colors[:entries, :3].tobytes()),
+    ]
+    if translucent.size > 0:
+        chunks.append(_chunk(b"tRNS", alphas[: translucent[-1] + 1].tobytes()))
+    chunks.append(_chunk(b"IDAT", zlib.compress(scanlines, compression_level)))
+    chunks.append(_chunk(b"IEND", b""))
+    return PNG_SIGNATURE + b"".join(chunks)
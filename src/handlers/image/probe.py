@@ -0,0 +1,89 @@
+import struct
+from typing import Optional, Tuple
+
+
+class UnknownFormatError(Exception):
+    """Raised when the data doesn't start like a supported image file."""
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            raise UnknownFormatError("Invalid JPEG marker.")
+        marker = data[position + 1]
+        if marker == 0xFF:  # Padding
+            position += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # No length
+            position += 2
+            continue
+        (length,) = struct.unpack(">H", data[position + 2 : position + 4])
+        # Start of frame markers, except DHT, JPG and DAC
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if position + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[position + 5 : position + 9])
+            return width, height
+        position += 2 + length
+    return None
+
+
+def _webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    raise UnknownFormatError("Unsupported WEBP format.")
+
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if len(data) < 24:
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def _gif_size(data: bytes) -> Optional[Tuple[int, int]]:
+    return struct.unpack("<HH", data[6:10])
+
+
+def _bmp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if len(data) < 26:
+        return None
+    width, height = struct.unpack("<ii", data[18:26])
+    return abs(width), abs(height)
+
+
+# (signature check, size reader) of each supported format
+_FORMATS = [
+    (lambda data: data.startswith(b"\x89PNG\r\n\x1a\n"), _png_size),
+    (lambda data: data.startswith(b"\xff\xd8"), _jpeg_size),
+    (lambda data: data[:6] in (b"GIF87a", b"GIF89a"), _gif_size),
+    (lambda data: data.startswith(b"RIFF") and data[8:12] == b"WEBP", _webp_size),
+    (lambda data: data.startswith(b"BM"), _bmp_size),
+]
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Get the dimensions of an image from the first bytes of its file, without decoding it.
+    Supports PNG, JPEG, GIF, WEBP and BMP.
+
+    :return: (width, height), or None if more data is needed.
+    :raise UnknownFormatError: If the data isn't a supported image.
+    """
+    if len(data) < 12:
+        return None
+    for is_format, read_size in _FORMATS:
+        if is_format(data):
+            return read_size(data)
+    raise UnknownFormatError("Unsupported image format.")
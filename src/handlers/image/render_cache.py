@@ -0,0 +1,44 @@
+from io import BytesIO
+from typing import Hashable, Optional, Tuple
+from handlers.cache import AsyncLRUCache
+from .palette import palette_hash
+from .utils import palettized2buffer
+
+
+class RenderCache(AsyncLRUCache):
+    """
+    A cache of PNG-encoded renders of palettized images, such as the board
+    or template previews, bounded by the total size of the encoded images.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        :param max_size: The maximum total size of the cached PNGs, in bytes.
+        """
+        super().__init__(max_size)
+
+    async def png(
+        self,
+        image,
+        palette: list,
+        key: Hashable,
+        crop: Optional[Tuple[int, int, int, int]] = None,
+        scale: int = 1,
+    ) -> BytesIO:
+        """
+        Get a PalettizedImage as a paletted PNG data buffer, encoding it only
+        if it isn't cached yet.
+
+        :param key: A key identifying the image's content, such as the board version.
+        It must change whenever the image does.
+        :param crop: An optional (x, y, width, height) region to encode.
+        :param scale: An integer upscaling factor.
+        """
+
+        async def encode():
+            buffer = await palettized2buffer(image, palette, crop=crop, scale=scale)
+            return buffer.getvalue()
+
+        full_key = (key, palette_hash(palette), crop, scale)
+        data = await self.get_or_compute(full_key, encode)
+        return BytesIO(data)
@@ -1,7 +1,22 @@
+import hashlib
 from io import BytesIO
+from typing import Optional, Tuple
 import cv2
 import numpy as np
-from handlers.pxls.utils import query
+from aioify import aioify
+from handlers.errors import UserError
+from handlers.http_client import http_client
+from .png import encode_indexed_png
+from .probe import image_size, UnknownFormatError
+
+# Maximum size of a downloaded image file, in bytes.
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+# Maximum width or height of a downloaded image.
+MAX_IMAGE_SIDE = 16384
+# Maximum number of pixels in a downloaded image.
+MAX_IMAGE_PIXELS = 50_000_000
+# The dimensions of an image are looked for in this many first bytes.
+PROBE_BYTES = 256 * 1024
 
 
 def hex2rgba(hex_num: str):
@@ -14,12 +29,40 @@ def hex2rgba(hex_num: str):
     return (*rgb, 255)
 
 
+def array_hash(array: np.ndarray) -> str:
+    """
+    Get a hash of an array's content, including its shape and type.
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """
+    Decode image file data to a RGBA numpy array.
+    Grayscale, rgb and 16-bit images are converted.
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError("Couldn't decode image.")
+    if image.dtype == np.uint16:
+        image = (image >> 8).astype(np.uint8)
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGBA)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+    # Swap the channels in place, without allocating a second image.
+    return cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA, dst=image)
+
+
 def buffer2image(buffer: BytesIO) -> np.ndarray:
     """
     Convert a data buffer to a RGBA numpy array.
     """
-    res_bgr = cv2.imdecode(np.frombuffer(buffer.read(), np.uint8), cv2.IMREAD_UNCHANGED)
-    return cv2.cvtColor(res_bgr, cv2.COLOR_BGRA2RGBA)
+    return decode_image(buffer.read())
 
 
 def image2buffer(image: np.ndarray) -> BytesIO:
@@ -32,9 +75,75 @@ def image2buffer(image: np.ndarray) -> BytesIO:
     return BytesIO(img_buffer)
 
 
-async def download_image(url: str) -> np.ndarray:
+@aioify
+def palettized2buffer(
+    image,
+    palette: list,
+    crop: Optional[Tuple[int, int, int, int]] = None,
+    scale: int = 1,
+    compression_level: int = 6,
+) -> BytesIO:
+    """
+    Convert a PalettizedImage to a paletted PNG data buffer.
+
+    :param palette: The palette used to render.
+    :param crop: An optional (x, y, width, height) region to encode.
+    :param scale: An integer upscaling factor.
+    :param compression_level: The zlib compression level, from 0 to 9.
+    """
+    return BytesIO(
+        encode_indexed_png(image.region(crop, scale), palette, compression_level)
+    )
+
+
+def check_image_size(width: int, height: int):
+    """
+    Make sure an image isn't too large to be processed.
+    """
+    if max(width, height) > MAX_IMAGE_SIDE or width * height > MAX_IMAGE_PIXELS:
+        raise UserError(
+            f"This image is too large ({width}x{height}), the maximum is"
+            f" {MAX_IMAGE_SIDE} pixels per side"
+            f" and {MAX_IMAGE_PIXELS // 1_000_000} million pixels in total."
+        )
+
+
+async def download_image(url: str, max_bytes: int = MAX_IMAGE_BYTES) -> np.ndarray:
     """
     Download an image from a given url as an rgba numpy array.
+    The download is streamed and aborted as soon as the file turns out to be
+    too large, either in bytes or in dimensions, which are read from the
+    file header before anything is decoded.
+
+    :param max_bytes: The maximum size of the image file.
+    :raise UserError: If the image is too large or isn't a supported image.
     """
-    response = await query(url, "binary")
-    return buffer2image(BytesIO(response))
+    too_large = UserError(
+        f"This image file is too large, the maximum is {max_bytes // 1024 // 1024}MB."
+    )
+    invalid = UserError("This link doesn't point to a valid image.")
+    data = bytearray()
+    size = None
+    async with http_client.get(url) as response:
+        if (response.content_length or 0) > max_bytes:
+            raise too_large
+        async for chunk in response.content.iter_any():
+            data += chunk
+            if len(data) > max_bytes:
+                raise too_large
+            if size is None:
+                try:
+                    size = image_size(bytes(data[:PROBE_BYTES]))
+                except UnknownFormatError as error:
+                    raise invalid from error
+                if size is not None:
+                    check_image_size(*size)
+                elif len(data) >= PROBE_BYTES:
+                    # The dimensions aren't in the file header.
+                    raise invalid
+    if size is None:
+        raise invalid
+    try:
+        return await aioify(decode_image)(data)
+    except ValueError as error:
+        raise invalid from error
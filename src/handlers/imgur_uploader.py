@@ -1,8 +1,7 @@
 from io import BytesIO
-import aiohttp
 import numpy as np
-from handlers.pxls.utils import BadResponseError
-from handlers.image import image2buffer
+from handlers.http_client import http_client
+from handlers.image import image2buffer, palettized2buffer
 
 
 class ImgurUploader:
@@ -22,16 +21,20 @@ class ImgurUploader:
         link = await self.upload_data(buffer)
         return link
 
+    async def upload_palettized(self, image, palette: list) -> str:
+        """
+        Upload a PalettizedImage to imgur, as a paletted PNG.
+        """
+        buffer = await palettized2buffer(image, palette)
+        link = await self.upload_data(buffer)
+        return link
+
     async def upload_data(self, data: BytesIO):
         """
         Upload binary data representing an image file.
         """
         url = "https://api.imgur.com/3/image/"
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url, data={"image": data.getvalue()}, headers=self.headers
-            ) as response:
-                if response.status != 200:
-                    raise BadResponseError("Query returned {response.status} code.")
-                response_content = await response.json()
-                return response_content["data"]["link"]
+        response_content = await http_client.post(
+            url, data={"image": data.getvalue()}, headers=self.headers
+        )
+        return response_content["data"]["link"]
@@ -1,4 +1,8 @@
 from .canvas import Canvas
+from .board import Board, BoardSnapshot
 from .template import Template, BaseTemplate
-from .progress import Progress, compute_progress
+from .progress import Progress, compute_progress, compute_progress_batch
 from .layer import layer
+from .progress_tracker import ProgressTracker
+from .history import BoardHistory
+from .heatmap import Heatmap
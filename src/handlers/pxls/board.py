@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from handlers.image import PalettizedImage
+from handlers.pxls.tiles import TileTracker
+
+
+def apply_pixels(
+    image: np.ndarray, xs: np.ndarray, ys: np.ndarray, colors: np.ndarray
+) -> np.ndarray:
+    """
+    Apply pixel updates to a contiguous image in order, using a single
+    assignment. When a pixel is updated several times, the last update wins.
+    Coordinates must be inside the image, they aren't checked.
+
+    :return: The color each pixel had right before its own update.
+    """
+    if len(xs) == 0:
+        return np.empty(0, dtype=image.dtype)
+    flat_image = image.reshape(-1)
+    flat = ys.astype(np.int64) * image.shape[1] + xs
+    order = np.argsort(flat, kind="stable")
+    flat, colors = flat[order], colors[order]
+    old_colors = flat_image[flat]
+    repeated = flat[1:] == flat[:-1]
+    old_colors[1:][repeated] = colors[:-1][repeated]
+    last = np.append(np.logical_not(repeated), True)
+    flat_image[flat[last]] = colors[last]
+    result = np.empty_like(old_colors)
+    result[order] = old_colors
+    return result
+
+
+class BoardSnapshot(PalettizedImage):
+    """
+    A read-only copy of the board, as it was at a given version.
+    """
+
+    def __init__(self, array: np.ndarray, version: int):
+        super().__init__(array)
+        self.version = version
+        self.taken_at = time.monotonic()
+
+
+class Board(PalettizedImage):
+    """
+    The live canvas board, safe to update from the websocket thread.
+
+    Readers should use snapshot() to get a consistent view of the board.
+    A refresh swaps in a new image atomically, and pixel updates received
+    while the new image was being downloaded are replayed onto it.
+    """
+
+    def __init__(self, array: np.ndarray):
+        super().__init__(array)
+        # Incremented on every board change.
+        self.version = 0
+        self.tiles = TileTracker(self.width, self.height)
+        self._lock = threading.Lock()
+        self._pending: Optional[List[Tuple[np.ndarray, ...]]] = None
+        self._snapshot: Optional[BoardSnapshot] = None
+
+    def update_pixels(
+        self, xs: np.ndarray, ys: np.ndarray, colors: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+        """
+        Apply a batch of pixel updates to the board, in order.
+        Updates outside of the board are dropped.
+
+        :return: The applied updates, as (xs, ys, old_colors, new_colors, version),
+        old_colors being the color each pixel had right before its own update,
+        and version the board version the batch resulted in.
+        """
+        with self._lock:
+            inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+            if not inside.all():
+                xs, ys, colors = xs[inside], ys[inside], colors[inside]
+            old_colors = apply_pixels(self.image, xs, ys, colors)
+            self.version += 1
+            self.tiles.mark_pixels(xs, ys, self.version)
+            if self._pending is not None:
+                self._pending.append((xs, ys, colors))
+            return xs, ys, old_colors, colors, self.version
+
+    def snapshot(self, max_age: float = 0) -> BoardSnapshot:
+        """
+        Get a read-only copy of the current board.
+        Snapshots are shared between readers as long as the board doesn't change.
+
+        :param max_age: How old the snapshot is allowed to be, in seconds.
+        Reusing a slightly outdated snapshot lets readers share renders of it.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and (
+                snapshot.version == self.version
+                or snapshot.image.shape == self.image.shape
+                and time.monotonic() - snapshot.taken_at <= max_age
+            ):
+                return snapshot
+            array = self.image.copy()
+            array.flags.writeable = False
+            self._snapshot = BoardSnapshot(array, self.version)
+            return self._snapshot
+
+    def begin_refresh(self) -> bool:
+        """
+        Start buffering pixel updates until the next swap().
+
+        :return: False if a refresh is already in progress.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return False
+            self._pending = []
+            return True
+
+    def cancel_refresh(self):
+        """
+        Stop buffering pixel updates without swapping the image.
+        """
+        with self._lock:
+            self._pending = None
+
+    def swap(
+        self, array: np.ndarray
+    ) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]]:
+        """
+        Replace the board image, replaying the pixel updates buffered
+        since begin_refresh() onto it.
+
+        :return: The pixels the swap changed, as (xs, ys, old_colors, new_colors,
+        version) like a batch of pixel updates, or None if the board size changed.
+        """
+        with self._lock:
+            for xs, ys, colors in self._pending or []:
+                apply_pixels(array, xs, ys, colors)
+            self._pending = None
+            self.version += 1
+            changes = None
+            if array.shape != self.image.shape:
+                self.tiles = TileTracker(array.shape[1], array.shape[0])
+                self.tiles.mark_all(self.version)
+            else:
+                ys, xs = np.nonzero(self.image != array)
+                self.tiles.mark_pixels(xs, ys, self.version)
+                changes = (xs, ys, self.image[ys, xs], array[ys, xs], self.version)
+            self.image = array
+            return changes
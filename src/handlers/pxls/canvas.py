@@ -1,8 +1,23 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
 from urllib.parse import urljoin
 import numpy as np
-from handlers.image import hex2rgba, PalettizedImage
+from aioify import aioify
+from handlers.cache import AsyncLRUCache
+from handlers.http_client import http_client
+from handlers.image import hex2rgba, PalettizedImage, palette_hash
 from handlers.pxls.stats import StatsRecord
-from handlers.pxls.utils import query
+from handlers.pxls.utils import query, query_into, BadResponseError
+from handlers.pxls.board import Board
+from handlers.pxls.heatmap import Heatmap
+
+logger = logging.getLogger("pyCharity." + __name__)
+
+# How long the online user count is reused for, in seconds.
+USERS_TTL = 10
 
 
 class Canvas:
@@ -11,11 +26,29 @@ class Canvas:
     manage requests to pxls.space.
     """
 
-    def __init__(self, base_url):
+    def __init__(
+        self,
+        base_url,
+        snapshot_dir: Optional[str] = None,
+        heatmap_half_life: Optional[float] = None,
+    ):
+        """
+        :param base_url: The website base url (eg: https://pxls.space)
+        :param snapshot_dir: A directory to persist the latest board in, used to
+        start up without waiting for the board download. Disabled if None.
+        :param heatmap_half_life: The half-life of the activity heatmap counts,
+        in seconds. If None, counts never decay.
+        """
         self.base_url = base_url
+        self.snapshot_dir = snapshot_dir
         self.info = {}
         self.palette = []
-        self.board = None
+        self.palette_hash = palette_hash(self.palette)
+        self.board: Optional[Board] = None
+        self.activity = Heatmap(half_life=heatmap_half_life)
+        self.pixel_listeners = []
+        self._stats: Optional[StatsRecord] = None
+        self._users = AsyncLRUCache(max_size=1, ttl=USERS_TTL, sizeof=lambda _: 1)
 
     @property
     def code(self) -> str:
@@ -26,10 +59,56 @@ class Canvas:
 
     async def setup(self):
         """
-        Make initial requests to pxls.space.
+        Make initial requests to pxls.space, unless a board snapshot is
+        available, in which case it is used until the next board update.
         """
+        if self.load_snapshot():
+            return
         await self.update_info()
-        self.board = await self.fetch_board()
+        await self.update_board()
+
+    def load_snapshot(self) -> bool:
+        """
+        Load the latest board snapshot and its canvas info.
+        The board file is memory-mapped, changes to the board are not written back.
+
+        :return: Whether a snapshot was loaded.
+        """
+        if self.snapshot_dir is None:
+            return False
+        try:
+            with open(os.path.join(self.snapshot_dir, "latest.json")) as file:
+                info = json.load(file)
+            board_path = os.path.join(self.snapshot_dir, f"{info['canvasCode']}.npy")
+            array = np.load(board_path, mmap_mode="c")
+        except FileNotFoundError:
+            return False
+        except Exception as error:
+            logger.warning(f"Couldn't load board snapshot: {error}")
+            return False
+        self.info = info
+        self.palette = [hex2rgba(c["value"]) for c in self.info["palette"]]
+        self.palette_hash = palette_hash(self.palette)
+        self.board = Board(array)
+        self.activity.resize(self.board.width, self.board.height)
+        logger.info(f"Loaded board snapshot for canvas {self.code}.")
+        return True
+
+    @aioify
+    def save_snapshot(self):
+        """
+        Persist the current board and canvas info, keyed by canvas code.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        board_path = os.path.join(self.snapshot_dir, f"{self.code}.npy")
+        info_path = os.path.join(self.snapshot_dir, "latest.json")
+        # Write to temporary files first so a crash never leaves a partial snapshot.
+        with open(board_path + ".tmp", "wb") as file:
+            np.save(file, self.board.snapshot().image)
+        with open(info_path + ".tmp", "w") as file:
+            json.dump(self.info, file)
+        os.replace(board_path + ".tmp", board_path)
+        os.replace(info_path + ".tmp", info_path)
 
     async def query(self, endpoint: str, content_type: str):
         """
@@ -38,37 +117,142 @@ class Canvas:
         :param content_type: 'json' or 'binary'
         """
         return await query(
-            url=urljoin(self.base_url, endpoint), content_type=content_type
+            url=urljoin(self.base_url, endpoint),
+            content_type=content_type,
+            endpoint=f"pxls/{endpoint}",
         )
 
     async def fetch_board(self) -> PalettizedImage:
         """
         Get the current canvas' board image.
+        The board data is streamed straight into the array backing the image.
         """
-        response = await self.query("boarddata?", "binary")
-        array = np.asarray(list(response), dtype=np.uint8).reshape(
-            (self.info["height"], self.info["width"])
+        width, height = self.info["width"], self.info["height"]
+        start = time.perf_counter()
+        array = np.empty(width * height, dtype=np.uint8)
+        size = await query_into(
+            urljoin(self.base_url, "boarddata?"), array, endpoint="pxls/boarddata"
+        )
+        if size != array.size:
+            raise BadResponseError(
+                f"Received {size} bytes of board data, expected {array.size}."
+            )
+        downloaded = time.perf_counter()
+        board_image = PalettizedImage(array.reshape((height, width)))
+        logger.debug(
+            f"Board downloaded in {downloaded - start:.2f}s,"
+            f" decoded in {1000 * (time.perf_counter() - downloaded):.2f}ms."
         )
-        board_image = PalettizedImage(array)
         return board_image
 
+    async def update_board(self) -> bool:
+        """
+        Replace the board with the current one, without blocking pixel updates:
+        the ones received during the download are replayed onto the new board.
+
+        :return: False if the board was already being updated, in which case
+        nothing is done.
+        """
+        if self.board is None:
+            self.board = Board((await self.fetch_board()).image)
+        else:
+            if not self.board.begin_refresh():
+                return False
+            try:
+                board = await self.fetch_board()
+            except Exception:
+                self.board.cancel_refresh()
+                raise
+            changes = self.board.swap(board.image)
+            # Listeners are told about the differences between the two boards,
+            # such as pixel updates the websocket missed.
+            if changes is not None:
+                for listener in self.pixel_listeners:
+                    listener(*changes)
+        self.activity.resize(self.board.width, self.board.height)
+        if self.snapshot_dir is not None:
+            try:
+                await self.save_snapshot()
+            except Exception as error:
+                logger.warning(f"Couldn't save board snapshot: {error}")
+        return True
+
+    def changed_since(self, template, version: int) -> bool:
+        """
+        Check whether the board changed under a template after a given version.
+        """
+        return self.board.tiles.changed_since(
+            template.ox, template.oy, template.width, template.height, version
+        )
+
+    def add_pixel_listener(self, listener):
+        """
+        Register a callable to be notified of every batch of pixel updates, with
+        the signature listener(xs, ys, old_colors, new_colors, version). The first
+        arguments are numpy arrays, old_colors being the color of each pixel right
+        before its update, and version is the board version the batch resulted in.
+        Listeners may be notified of batches out of version order.
+        Board refreshes are notified as a batch of the pixels they changed.
+        """
+        self.pixel_listeners.append(listener)
+
+    def update_pixels(self, xs: np.ndarray, ys: np.ndarray, colors: np.ndarray):
+        """
+        Apply a batch of pixel updates to the board, in order.
+        Updates outside of the board are dropped.
+        """
+        xs, ys, old_colors, colors, version = self.board.update_pixels(xs, ys, colors)
+        self.activity.add(xs, ys)
+        for listener in self.pixel_listeners:
+            listener(xs, ys, old_colors, colors, version)
+
     def update_pixel(self, x: int, y: int, color: int):
         """
         Update a pixel's value on the board.
         """
-        self.board.image[y, x] = color
+        self.update_pixels(np.array([x]), np.array([y]), np.array([color], np.uint8))
 
     async def fetch_users(self) -> int:
-        """Get the number of online users."""
-        response_json = await self.query("users", "json")
-        return response_json["count"]
+        """
+        Get the number of online users.
+        The count is cached for USERS_TTL seconds, shared by concurrent callers.
+        """
+
+        async def fetch():
+            response_json = await self.query("users", "json")
+            return response_json["count"]
+
+        return await self._users.get_or_compute("users", fetch)
 
     async def update_info(self) -> None:
-        """Update the canvas info, and update the palette."""
-        self.info = await self.query("info", "json")
-        self.palette = [hex2rgba(c["value"]) for c in self.info["palette"]]
+        """
+        Update the canvas info, and update the palette.
+        """
+        info, modified = await http_client.fetch(
+            urljoin(self.base_url, "info"),
+            "json",
+            conditional=True,
+            endpoint="pxls/info",
+        )
+        if not modified and self.info:
+            return
+        self.info = info
+        palette = [hex2rgba(c["value"]) for c in self.info["palette"]]
+        if palette_hash(palette) != self.palette_hash:
+            self.palette = palette
+            self.palette_hash = palette_hash(palette)
 
     async def fetch_stats(self) -> StatsRecord:
-        """Get the current stats."""
-        stats_json = await self.query("stats/stats.json", "json")
-        return StatsRecord.from_json(stats_json, self.code)
+        """
+        Get the current stats.
+        Stats that didn't change since the last call aren't downloaded or parsed again.
+        """
+        stats_json, modified = await http_client.fetch(
+            urljoin(self.base_url, "stats/stats.json"),
+            "json",
+            conditional=True,
+            endpoint="pxls/stats",
+        )
+        if modified or self._stats is None or self._stats.canvas_code != self.code:
+            self._stats = StatsRecord.from_json(stats_json, self.code)
+        return self._stats
@@ -10,20 +10,19 @@ def fast_detemplatize(np.uint8_t[:, :, :] array, int true_height, int true_width
 
     result = np.zeros((true_height, true_width,4), dtype=np.uint8)
     cdef np.uint8_t[:, :, :] result_view = result
-    
-    cdef np.uint8_t alpha
-    
+
     cdef int x, y, b_y, b_x
 
-    for y in prange(block_size*true_height, nogil=True):
-        for x in range(block_size*true_width):
-            alpha = array[y, x, 3]
-            if alpha!=0:
-                b_y = y//block_size
-                b_x = x//block_size
-                result_view[b_y,b_x,0] = array[y, x, 0]
-                result_view[b_y,b_x,1] = array[y, x, 1]
-                result_view[b_y,b_x,2] = array[y, x, 2]
-                result_view[b_y,b_x,3] = 255
+    # Each thread handles whole rows of blocks, so that every output pixel is written
+    # by a single thread and the last opaque pixel of each block always wins.
+    for b_y in prange(true_height, nogil=True, schedule="static"):
+        for y in range(b_y*block_size, (b_y+1)*block_size):
+            for x in range(block_size*true_width):
+                if array[y, x, 3]!=0:
+                    b_x = x//block_size
+                    result_view[b_y,b_x,0] = array[y, x, 0]
+                    result_view[b_y,b_x,1] = array[y, x, 1]
+                    result_view[b_y,b_x,2] = array[y, x, 2]
+                    result_view[b_y,b_x,3] = 255
 
-    return result
\ No newline at end of file
+    return result
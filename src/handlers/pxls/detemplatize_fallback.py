@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def numpy_detemplatize(
+    array: np.ndarray, true_height: int, true_width: int, block_size: int
+) -> np.ndarray:
+    """
+    Pure numpy equivalent of the compiled fast_detemplatize, used when the
+    extension isn't built.
+
+    Each block_size x block_size block of the styled image becomes one pixel,
+    taking the color of the last non-transparent pixel of the block in row-major order.
+    """
+    region = array[: true_height * block_size, : true_width * block_size]
+    blocks = region.reshape(true_height, block_size, true_width, block_size, 4)
+    blocks = blocks.transpose(0, 2, 1, 3, 4).reshape(
+        true_height, true_width, block_size * block_size, 4
+    )
+    opaque = blocks[..., 3] != 0
+    # Index of the last opaque pixel of each block.
+    last = block_size * block_size - 1 - opaque[..., ::-1].argmax(axis=-1)
+    colors = np.take_along_axis(blocks, last[..., np.newaxis, np.newaxis], axis=2)
+    result = np.zeros((true_height, true_width, 4), dtype=np.uint8)
+    found = opaque.any(axis=-1)
+    result[found, :3] = colors[found, 0, :3]
+    result[found, 3] = 255
+    return result
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Optional
+import cv2
+import numpy as np
+from aioify import aioify
+
+
+class Heatmap:
+    """
+    A per-pixel count of the placements on the board, with optional
+    exponential decay so that recent activity stands out.
+    """
+
+    def __init__(self, half_life: Optional[float] = None):
+        """
+        :param half_life: The time it takes for the counts to be halved,
+        in seconds. If None, counts never decay.
+        """
+        self.half_life = half_life
+        self.counts = np.zeros((0, 0), dtype=np.uint32)
+        self._last_decay = time.monotonic()
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+
+    def resize(self, width: int, height: int):
+        """
+        Reset the counts if the board size changed.
+        """
+        with self._lock:
+            if self.counts.shape != (height, width):
+                self.counts = np.zeros((height, width), dtype=np.uint32)
+
+    def add(self, xs: np.ndarray, ys: np.ndarray):
+        """
+        Count a batch of placements.
+        """
+        with self._lock:
+            np.add.at(self.counts, (ys, xs), 1)
+
+    def decay(self):
+        """
+        Apply the decay corresponding to the time elapsed since the last call.
+        Decayed counts are rounded up or down at random, in proportion to their
+        fractional part, so that small counts decay on average instead of being
+        rounded back to their previous value.
+        """
+        now = time.monotonic()
+        if self.half_life is not None:
+            factor = 0.5 ** ((now - self._last_decay) / self.half_life)
+            with self._lock:
+                decayed = self.counts.astype(np.float32)
+                decayed *= factor
+                decayed += self._rng.random(decayed.shape, dtype=np.float32)
+                self.counts = decayed.astype(np.uint32)
+        self._last_decay = now
+
+    @aioify
+    def render(self, board_image: np.ndarray, ox: int = 0, oy: int = 0) -> np.ndarray:
+        """
+        Render the heatmap over a dimmed, grayscale version of the board.
+
+        :param board_image: The rgba image of the region of the board to render.
+        :param ox, oy: The position of the region's top-left corner on the board.
+        """
+        height, width = board_image.shape[:2]
+        counts = self.counts[oy : oy + height, ox : ox + width].astype(np.float32)
+        heat = np.log1p(counts)
+        heat /= max(float(heat.max()), 1.0)
+        colors = cv2.applyColorMap((255 * heat).astype(np.uint8), cv2.COLORMAP_INFERNO)
+        colors = cv2.cvtColor(colors, cv2.COLOR_BGR2RGB).astype(np.float32)
+        gray = 0.35 * board_image[..., :3].mean(axis=-1, keepdims=True)
+        heat = heat[..., np.newaxis]
+        result = np.empty(board_image.shape, dtype=np.uint8)
+        result[..., :3] = gray * (1 - heat) + colors * heat
+        result[..., 3] = board_image[..., 3]
+        return result
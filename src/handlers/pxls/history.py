@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+import numpy as np
+from aioify import aioify
+from handlers.pxls.board import apply_pixels
+
+# On-disk layout of a pixel placement: milliseconds since epoch, position and color.
+PIXEL_RECORD = np.dtype([("time", "<i8"), ("x", "<u2"), ("y", "<u2"), ("color", "u1")])
+
+
+def _to_ms(when: datetime) -> int:
+    return int(when.timestamp() * 1000)
+
+
+def _bisect(times: np.ndarray, value: int, right: bool) -> int:
+    """
+    Binary search on a sorted, possibly memory-mapped array, without
+    reading more than a logarithmic number of elements.
+    """
+    low, high = 0, len(times)
+    while low < high:
+        middle = (low + high) // 2
+        if times[middle] < value or (right and times[middle] == value):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class BoardHistory:
+    """
+    An on-disk history of the board, made of periodic compressed keyframes
+    and an append-only log of every pixel placed in between.
+
+    Past boards are rebuilt from the closest previous keyframe, by replaying
+    the pixels placed since.
+    """
+
+    def __init__(self, directory: str, canvas, keyframe_interval: int = 3600):
+        """
+        :param directory: The directory the history is stored in.
+        :param canvas: The canvas whose history is recorded.
+        :param keyframe_interval: The minimum time between two keyframes, in seconds.
+        """
+        self.directory = directory
+        self.canvas = canvas
+        self.keyframe_interval = keyframe_interval
+        self._lock = threading.Lock()
+        # Logs whose partial records, left by a crash, were already dropped
+        self._checked_logs: Set[str] = set()
+        # Time of the last logged records, so that the log stays sorted
+        # even if the clock goes backwards.
+        self._last_time = 0
+
+    def _canvas_dir(self, code: str) -> str:
+        path = os.path.join(self.directory, code)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _log_path(self, code: str) -> str:
+        return os.path.join(self._canvas_dir(code), "pixels.log")
+
+    def on_pixels(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        old_colors: np.ndarray,
+        new_colors: np.ndarray,
+        version: int,
+    ):
+        """
+        Append a batch of pixel updates to the log.
+        Meant to be registered as a canvas pixel listener.
+        """
+        # pylint: disable = unused-argument
+        records = np.empty(len(xs), dtype=PIXEL_RECORD)
+        records["x"], records["y"], records["color"] = xs, ys, new_colors
+        with self._lock:
+            log_path = self._log_path(self.canvas.code)
+            if log_path not in self._checked_logs:
+                self._drop_partial_record(log_path)
+                self._checked_logs.add(log_path)
+            self._last_time = max(int(time.time() * 1000), self._last_time)
+            records["time"] = self._last_time
+            with open(log_path, "ab") as log:
+                log.write(records.tobytes())
+
+    @staticmethod
+    def _drop_partial_record(log_path: str):
+        """
+        Truncate the partial record a crash in the middle of a write
+        may have left at the end of a log.
+        """
+        if not os.path.exists(log_path):
+            return
+        size = os.path.getsize(log_path)
+        if size % PIXEL_RECORD.itemsize != 0:
+            os.truncate(log_path, size - size % PIXEL_RECORD.itemsize)
+
+    def _keyframes(self, code: str) -> List[Tuple[int, str]]:
+        """
+        Get the (time, path) of every keyframe of a canvas, sorted by time.
+        """
+        keyframes = []
+        directory = self._canvas_dir(code)
+        for filename in os.listdir(directory):
+            if filename.startswith("keyframe_") and filename.endswith(".npz"):
+                timestamp = int(filename[len("keyframe_") : -len(".npz")])
+                keyframes.append((timestamp, os.path.join(directory, filename)))
+        return sorted(keyframes)
+
+    @aioify
+    def maybe_add_keyframe(self) -> bool:
+        """
+        Save the current board as a keyframe, if the last one is old enough.
+
+        :return: Whether a keyframe was saved.
+        """
+        code = self.canvas.code
+        now = int(time.time() * 1000)
+        keyframes = self._keyframes(code)
+        if keyframes and now - keyframes[-1][0] < 1000 * self.keyframe_interval:
+            return False
+        path = os.path.join(self._canvas_dir(code), f"keyframe_{now}.npz")
+        with open(path + ".tmp", "wb") as file:
+            np.savez_compressed(file, image=self.canvas.board.snapshot().image)
+        os.replace(path + ".tmp", path)
+        return True
+
+    def _replay(self, code: str, when: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the closest keyframe before a given time, and the pixel
+        placements that happened between the two.
+        """
+        target = _to_ms(when)
+        keyframes = [k for k in self._keyframes(code) if k[0] <= target]
+        if len(keyframes) == 0:
+            raise ValueError("No history is available for this time.")
+        keyframe_time, keyframe_path = keyframes[-1]
+        with np.load(keyframe_path) as keyframe:
+            image = np.asarray(keyframe["image"])
+        log_path = self._log_path(code)
+        # A partial record at the end of the log, being written or left by a
+        # crash, is ignored.
+        count = 0
+        if os.path.exists(log_path):
+            count = os.path.getsize(log_path) // PIXEL_RECORD.itemsize
+        if count == 0:
+            return image, np.empty(0, dtype=PIXEL_RECORD)
+        log = np.memmap(log_path, dtype=PIXEL_RECORD, mode="r", shape=(count,))
+        times = log["time"]
+        start = _bisect(times, keyframe_time, right=False)
+        end = _bisect(times, target, right=True)
+        return image, np.array(log[start:end])
+
+    @aioify
+    def board_at(self, when: datetime, code: Optional[str] = None) -> np.ndarray:
+        """
+        Rebuild the board as it was at a given time.
+
+        :param code: The canvas code, defaults to the current canvas.
+        """
+        image, records = self._replay(code or self.canvas.code, when)
+        apply_pixels(image, records["x"], records["y"], records["color"])
+        return image
+
+    @aioify
+    def region_at(
+        self,
+        when: datetime,
+        ox: int,
+        oy: int,
+        width: int,
+        height: int,
+        code: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Rebuild a region of the board, such as a template's, as it was at a given time.
+
+        :param code: The canvas code, defaults to the current canvas.
+        """
+        image, records = self._replay(code or self.canvas.code, when)
+        region = np.ascontiguousarray(image[oy : oy + height, ox : ox + width])
+        xs = records["x"].astype(np.int64) - ox
+        ys = records["y"].astype(np.int64) - oy
+        inside = (xs >= 0) & (xs < region.shape[1]) & (ys >= 0) & (ys < region.shape[0])
+        apply_pixels(region, xs[inside], ys[inside], records["color"][inside])
+        return region
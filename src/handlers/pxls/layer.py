@@ -14,10 +14,7 @@ def layer(canvas_width: int, canvas_height: int, *templates) -> BaseTemplate:
     min_x, min_y = canvas_width, canvas_height
     for template in templates:
         ox, oy = template.ox, template.oy
-        mask = template.image != 255
-        background[oy : oy + template.height, ox : ox + template.width][
-            mask
-        ] = template.image[mask]
+        background.ravel()[template.board_indices(canvas_width)] = template.sparse[1]
         min_x = min(ox, min_x)
         min_y = min(oy, min_y)
         max_x = max(ox + template.width, max_x)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List
 from aioify import aioify
 import numpy as np
 
@@ -8,17 +8,26 @@ class Progress:
     Template progress data container.
     """
 
-    def __init__(self, correct: int, total: int, array: Optional[np.ndarray] = None):
+    def __init__(
+        self,
+        correct: int,
+        total: int,
+        array: Optional[np.ndarray] = None,
+        version: Optional[int] = None,
+    ):
         """
         :param correct: The number of correct pixels.
         :param total: The number of non-transparent, placeable pixels
         in the template.
         :param array: A numpy array showing visual progress
         (0=wrong, 1=correct, 2=not in placemap, 255=transparent).
+        :param version: The version of the board the progress was measured on,
+        if it was measured on the board.
         """
         self.correct = correct
         self.total = total
         self.array = array
+        self.version = version
 
     @property
     def percentage(self):
@@ -48,10 +57,11 @@ def compute_progress(canvas, template, compute_array=False) -> Progress:
 
     :param compute_array: Wheter to attach progress_array to the returned Progress.
     """
+    snapshot = canvas.board.snapshot()
+    if not compute_array:
+        return _sparse_progress(snapshot, [template])[0]
     ox, oy = template.ox, template.oy
-    canvas_section = canvas.board.image[
-        oy : oy + template.height, ox : ox + template.width
-    ]
+    canvas_section = snapshot.image[oy : oy + template.height, ox : ox + template.width]
     template_transparent = template.image == 255
     canvas_transparent = canvas_section == 255
     mask = np.logical_or(template_transparent, canvas_transparent)
@@ -60,10 +70,52 @@ def compute_progress(canvas, template, compute_array=False) -> Progress:
     transparent_num = np.count_nonzero(mask)
     completed_pixels = np.count_nonzero(progress_array) - transparent_num
     total_pixels = canvas_section.size - transparent_num
-    if compute_array:
-        progress_array[
-            np.logical_and(np.logical_not(template_transparent), canvas_transparent)
-        ] = 2
-        return Progress(completed_pixels, total_pixels, progress_array)
+    progress_array[
+        np.logical_and(np.logical_not(template_transparent), canvas_transparent)
+    ] = 2
+    return Progress(completed_pixels, total_pixels, progress_array, snapshot.version)
+
+
+@aioify
+def compute_progress_batch(canvas, templates) -> List[Progress]:
+    """
+    Measure the completion of several templates in a single pass over the board.
+    Only the opaque pixels of each template are read, so the cost scales with
+    the area covered by the templates rather than with their bounding boxes.
+
+    :return: The templates' progress, in the same order as templates.
+    """
+    templates = list(templates)
+    if len(templates) == 0:
+        return []
+    return _sparse_progress(canvas.board.snapshot(), templates)
 
-    return Progress(completed_pixels, total_pixels)
+
+def _sparse_progress(snapshot, templates) -> List[Progress]:
+    """
+    Measure the progress of templates from their sparse form, with a single
+    gather of the board pixels they cover.
+    """
+    board = snapshot.image.ravel()
+    indices = [template.board_indices(snapshot.width) for template in templates]
+    expected = [template.sparse[1] for template in templates]
+    bounds = np.cumsum([0] + [idx.size for idx in indices])
+    # Gather every covered board pixel at once, and reuse the same
+    # mask buffer for both comparisons.
+    actual = board.take(np.concatenate(indices))
+    mask = np.empty(actual.shape, dtype=bool)
+    counts = np.zeros(actual.size + 1, dtype=np.int64)
+
+    def segment_sums():
+        np.cumsum(mask, out=counts[1:])
+        return counts[bounds[1:]] - counts[bounds[:-1]]
+
+    np.not_equal(actual, 255, out=mask)
+    totals = segment_sums()
+    # Transparent template pixels are excluded, so a match is always placeable.
+    np.equal(actual, np.concatenate(expected), out=mask)
+    corrects = segment_sums()
+    return [
+        Progress(int(correct), int(total), version=snapshot.version)
+        for correct, total in zip(corrects, totals)
+    ]
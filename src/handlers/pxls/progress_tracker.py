@@ -0,0 +1,195 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import numpy as np
+from .progress import Progress
+
+# Side length, in pixels, of the cells used by the coverage index.
+INDEX_TILE_SIZE = 64
+
+# Number of recent pixel updates kept to be replayed onto newly tracked templates.
+JOURNAL_SIZE = 1 << 20
+
+
+class _TrackedTemplate:
+    """
+    The live progress counters of a single tracked template.
+    """
+
+    def __init__(self, template, progress: Progress):
+        self.ox = template.ox
+        self.oy = template.oy
+        self.image = template.image
+        self.correct = progress.correct
+        self.total = progress.total
+        # Updates up to this board version are already part of the counters.
+        self.version = -1 if progress.version is None else progress.version
+
+    def on_pixel(self, x: int, y: int, old_color: int, new_color: int):
+        """
+        Adjust the counters after the board pixel at (x, y) changed color.
+        """
+        x, y = x - self.ox, y - self.oy
+        if not (0 <= x < self.image.shape[1] and 0 <= y < self.image.shape[0]):
+            return
+        expected = int(self.image[y, x])
+        if expected == 255:
+            return
+        self.total += (new_color != 255) - (old_color != 255)
+        self.correct += (new_color == expected) - (old_color == expected)
+
+    def on_pixels(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        old_colors: np.ndarray,
+        new_colors: np.ndarray,
+    ):
+        """
+        Adjust the counters after a batch of board pixels changed color.
+        """
+        xs, ys = xs.astype(np.int64) - self.ox, ys.astype(np.int64) - self.oy
+        height, width = self.image.shape
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        expected = self.image[ys[inside], xs[inside]]
+        opaque = expected != 255
+        expected = expected[opaque]
+        old_colors, new_colors = old_colors[inside][opaque], new_colors[inside][opaque]
+        self.total += int(np.count_nonzero(new_colors != 255))
+        self.total -= int(np.count_nonzero(old_colors != 255))
+        self.correct += int(np.count_nonzero(new_colors == expected))
+        self.correct -= int(np.count_nonzero(old_colors == expected))
+
+
+class ProgressTracker:
+    """
+    Keep the progress of tracked templates up to date in real-time,
+    by applying each pixel placed on the canvas to the templates covering it.
+
+    Templates are tracked by canvas code and name. The recent pixel updates
+    are journaled with their board version, so that updates received while
+    a template's progress was being computed can be replayed onto it.
+    """
+
+    def __init__(self, journal_size: int = JOURNAL_SIZE):
+        """
+        :param journal_size: The number of recent pixel updates kept for replays.
+        """
+        self.journal_size = journal_size
+        self._templates: Dict[Tuple[str, str], _TrackedTemplate] = {}
+        # Maps index tiles to the templates having opaque pixels in them.
+        self._index: Dict[Tuple[int, int], List[_TrackedTemplate]] = {}
+        # (version, xs, ys, old colors, new colors) of the recent updates
+        self._journal: Deque[
+            Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        ] = deque()
+        self._journaled = 0
+        # Updates up to this version were dropped from the journal.
+        self._dropped_version = -1
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _covered_tiles(template) -> List[Tuple[int, int]]:
+        """
+        Get the index tiles containing at least one opaque pixel of the template.
+        """
+        rows, cols = np.divmod(template.sparse[0], template.width)
+        tile_y = (rows + template.oy) // INDEX_TILE_SIZE
+        tile_x = (cols + template.ox) // INDEX_TILE_SIZE
+        tiles = np.unique(np.stack((tile_x, tile_y), axis=-1), axis=0)
+        return [(int(x), int(y)) for x, y in tiles]
+
+    def track(self, template, progress: Progress) -> bool:
+        """
+        Start tracking a template, replacing any tracked template with the same
+        canvas code and name. The pixel updates received since the board version
+        progress was measured at are replayed onto it.
+
+        :param template: The template to track.
+        :param progress: The template's progress on the current board.
+        :return: False if some of the updates to replay were already dropped
+        from the journal, in which case the tracked progress is approximate.
+        """
+        tracked = _TrackedTemplate(template, progress)
+        tiles = self._covered_tiles(template)
+        key = (template.canvas_code, template.name)
+        with self._lock:
+            self._remove(key)
+            self._templates[key] = tracked
+            for tile in tiles:
+                self._index.setdefault(tile, []).append(tracked)
+            for version, *update in self._journal:
+                if version > tracked.version:
+                    tracked.on_pixels(*update)
+            if progress.version is None:
+                return False
+            return progress.version >= self._dropped_version
+
+    def untrack(self, canvas_code: str, name: str):
+        """
+        Stop tracking a template.
+        """
+        with self._lock:
+            self._remove((canvas_code, name))
+
+    def retain_canvas(self, canvas_code: str):
+        """
+        Stop tracking the templates of every other canvas.
+        """
+        with self._lock:
+            for key in list(self._templates):
+                if key[0] != canvas_code:
+                    self._remove(key)
+
+    def _remove(self, key: Tuple[str, str]):
+        tracked = self._templates.pop(key, None)
+        if tracked is None:
+            return
+        for tile, templates in list(self._index.items()):
+            if tracked in templates:
+                templates.remove(tracked)
+                if len(templates) == 0:
+                    del self._index[tile]
+
+    def _journal_update(self, version: int, update: Tuple[np.ndarray, ...]):
+        """
+        Add an update to the journal, dropping the oldest ones if it is full.
+        """
+        self._journal.append((version, *update))
+        self._journaled += update[0].size
+        while self._journaled > self.journal_size:
+            dropped = self._journal.popleft()
+            self._journaled -= dropped[1].size
+            self._dropped_version = max(self._dropped_version, dropped[0])
+
+    def get(self, canvas_code: str, name: str) -> Optional[Progress]:
+        """
+        Get the live progress of a tracked template, or None if it isn't tracked.
+        """
+        tracked = self._templates.get((canvas_code, name))
+        if tracked is None:
+            return None
+        return Progress(tracked.correct, tracked.total)
+
+    def on_pixels(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        old_colors: np.ndarray,
+        new_colors: np.ndarray,
+        version: int,
+    ):
+        """
+        Update the progress of every template covering the updated pixels,
+        unless the template's progress was measured after this update.
+        Meant to be registered as a canvas pixel listener.
+        """
+        changed = old_colors != new_colors
+        update = (xs[changed], ys[changed], old_colors[changed], new_colors[changed])
+        with self._lock:
+            self._journal_update(version, update)
+            for x, y, old_color, new_color in zip(*(a.tolist() for a in update)):
+                tile = (x // INDEX_TILE_SIZE, y // INDEX_TILE_SIZE)
+                for tracked in self._index.get(tile, ()):
+                    if tracked.version < version:
+                        tracked.on_pixel(x, y, old_color, new_color)
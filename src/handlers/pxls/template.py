@@ -1,15 +1,33 @@
-from typing import Tuple, Dict, List
+import hashlib
+import logging
+from typing import Tuple, Dict, List, Optional
 from urllib.parse import parse_qs
 import numpy as np
 from aioify import aioify
-import pyximport
-from handlers.image import PalettizedImage, download_image
+from handlers.cache import AsyncLRUCache
+from handlers.image import PalettizedImage, download_image, quantize, array_hash
 from .canvas import Canvas
 from .progress import compute_progress, Progress
+from .detemplatize_fallback import numpy_detemplatize
 
-# pylint: disable = import-error, wrong-import-position
-pyximport.install()
-from .detemplatize import fast_detemplatize
+try:
+    # Built with `python build.py build_ext --inplace`
+    from .detemplatize import fast_detemplatize  # pylint: disable = import-error
+except ImportError:
+    fast_detemplatize = numpy_detemplatize
+    logging.getLogger("pyCharity." + __name__).warning(
+        "The detemplatize extension isn't built, using the slower numpy version."
+    )
+
+# How long resolved template links are reused for, in seconds.
+RESOLVED_TTL = 600
+# Maximum total size of the cached resolved template arrays, in bytes.
+RESOLVED_CACHE_SIZE = 64 * 1024 * 1024
+
+# (url, palette hash, canvas width, canvas height) -> (array, ox, oy)
+_resolved = AsyncLRUCache(
+    max_size=RESOLVED_CACHE_SIZE, ttl=RESOLVED_TTL, sizeof=lambda value: value[0].nbytes
+)
 
 
 class BaseTemplate(PalettizedImage):
@@ -18,22 +36,83 @@ class BaseTemplate(PalettizedImage):
     contained in a template.
     """
 
-    def __init__(self, array, ox, oy):
+    def __init__(self, array, ox, oy, image_hash: Optional[str] = None):
+        """
+        :param image_hash: The hash of the image, if already known.
+        """
         super().__init__(array)
         self.ox = ox
         self.oy = oy
+        self._image_hash = image_hash
+        self._content_hash: Optional[str] = None
+        self._sparse: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def image_hash(self) -> str:
+        """
+        Get a hash of the template's image, computed on first use.
+        Images are stored by this hash.
+        """
+        if self._image_hash is None:
+            self._image_hash = array_hash(self.image)
+        return self._image_hash
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Get a hash of the template's image and position, computed on first use.
+        """
+        if self._content_hash is None:
+            key = f"{self.image_hash}:{self.ox}:{self.oy}".encode()
+            self._content_hash = hashlib.blake2b(key, digest_size=16).hexdigest()
+        return self._content_hash
+
+    @property
+    def sparse(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the positions, as row-major indexes within the template, and the colors
+        of the template's opaque pixels. Built on first use.
+        """
+        if self._sparse is None:
+            flat = np.ascontiguousarray(self.image).ravel()
+            positions = np.flatnonzero(flat != 255)
+            self._sparse = (positions, flat[positions])
+        return self._sparse
+
+    def board_indices(self, board_width: int) -> np.ndarray:
+        """
+        Get the row-major board indexes of the template's opaque pixels.
+        """
+        rows, cols = np.divmod(self.sparse[0], self.width)
+        return (rows + self.oy) * board_width + cols + self.ox
 
     @classmethod
     async def from_url(cls, template_url: str, canvas: Canvas):
         """
         Generate a template from a pxls.space url.
+        Resolved links are cached for RESOLVED_TTL seconds, and concurrent
+        resolutions of the same link share a single download.
+        The resulting image is read-only, as it may be shared.
         """
-        params, styled_image = await cls.process_link(template_url)
-        rendered_image = await cls.detemplatize(styled_image, int(params["tw"][0]))
-        palettized_array = await cls.reduce(rendered_image, canvas.palette)
-        ox, oy = int(params["ox"][0]), int(params["oy"][0])
-        palettized_array, ox, oy = cls.crop_to_canvas(palettized_array, ox, oy, canvas)
-        return cls(array=palettized_array, ox=ox, oy=oy)
+
+        async def resolve():
+            params, styled_image = await cls.process_link(template_url)
+            rendered_image = await cls.detemplatize(styled_image, int(params["tw"][0]))
+            array = await cls.reduce(rendered_image, canvas.palette)
+            ox, oy = int(params["ox"][0]), int(params["oy"][0])
+            array, ox, oy = cls.crop_to_canvas(array, ox, oy, canvas)
+            array = np.ascontiguousarray(array)
+            array.flags.writeable = False
+            return array, ox, oy
+
+        key = (
+            template_url,
+            canvas.palette_hash,
+            canvas.board.width,
+            canvas.board.height,
+        )
+        array, ox, oy = await _resolved.get_or_compute(key, resolve)
+        return cls(array=array, ox=ox, oy=oy)
 
     @staticmethod
     def crop_to_canvas(
@@ -92,22 +171,10 @@ class BaseTemplate(PalettizedImage):
         """
         Convert a rendered image to its palettized equivalent.
         Colors that aren't in the palette are automatically mappped to their
-        nearest equivalent.
-        """
-        palette = palette.copy()
-        palette.append((0, 0, 0, 0))
-        # Don't try to vectorize this, using np.stack and argmin
-        # uses a crazy amount of memory and is a tad slower on real images.
-        best_match_idx = np.zeros(rendered_array.shape[:2], dtype=np.uint8)
-        best_match_dist = np.full(rendered_array.shape[:2], 500)  # 500>sqrt(3*255^2)
-        for idx, color in enumerate(palette):
-            color_distance = np.linalg.norm(rendered_array - color, axis=-1)
-            closer_mask = color_distance < best_match_dist
-            best_match_dist[closer_mask] = color_distance[closer_mask]
-            best_match_idx[closer_mask] = idx
-        # Transparent pixels have code 255
-        best_match_idx[best_match_idx == len(palette) - 1] = 255
-        return best_match_idx
+        nearest equivalent, computed once for each distinct color in the image.
+        Pixels that are more than half transparent are mapped to 255.
+        """
+        return quantize(rendered_array, palette)
 
 
 class Template(BaseTemplate):
@@ -126,6 +193,7 @@ class Template(BaseTemplate):
         owner: int,
         scope: str,
         progress: Progress,
+        image_hash: Optional[str] = None,
     ):
         """
         :param array: A palettized array representing the template image.
@@ -137,8 +205,9 @@ class Template(BaseTemplate):
         :param owner: The id of the faction or user owning this template.
         :param scope: The type of the owner: 'faction'|'user',
         :param progress: The template's progress state.
+        :param image_hash: The hash of the image, if already known.
         """
-        super().__init__(array, ox, oy)
+        super().__init__(array, ox, oy, image_hash)
         self.name = name
         self.url = url
         self.owner = owner
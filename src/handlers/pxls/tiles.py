@@ -0,0 +1,43 @@
+import numpy as np
+
+# Side length, in pixels, of the tiles the board is divided in.
+TILE_SIZE = 64
+
+
+class TileTracker:
+    """
+    Keep track of the board version at which each tile of the board last changed,
+    so that regions of the board can be checked for changes cheaply.
+    """
+
+    def __init__(self, width: int, height: int, tile_size: int = TILE_SIZE):
+        self.tile_size = tile_size
+        shape = (-(-height // tile_size), -(-width // tile_size))
+        self.versions = np.zeros(shape, dtype=np.int64)
+
+    def mark_pixels(self, xs: np.ndarray, ys: np.ndarray, version: int):
+        """
+        Mark the tiles containing the pixels at (xs, ys) as changed.
+        """
+        self.versions[ys // self.tile_size, xs // self.tile_size] = version
+
+    def mark_all(self, version: int):
+        """
+        Mark every tile as changed.
+        """
+        self.versions[:] = version
+
+    def changed_since(
+        self, ox: int, oy: int, width: int, height: int, version: int
+    ) -> bool:
+        """
+        Check whether any tile overlapping a region changed after a given version.
+        """
+        if width <= 0 or height <= 0:
+            return False
+        size = self.tile_size
+        region = self.versions[
+            oy // size : (oy + height - 1) // size + 1,
+            ox // size : (ox + width - 1) // size + 1,
+        ]
+        return int(region.max(initial=0)) > version
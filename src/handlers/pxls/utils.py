@@ -1,21 +1,26 @@
+from typing import Optional
 from urllib.parse import urljoin, urlencode
 from aioify import aioify
 import numpy as np
-import aiohttp
+from handlers.http_client import http_client, BadResponseError
 
 
 @aioify
-def style_dotted(image: np.ndarray, block_size=3) -> np.ndarray:
+def style_dotted(image: np.ndarray, block_size=3, fill_value=0) -> np.ndarray:
     """
     Generate a dotted style template image from a template.
+    Works on rgba images as well as on arrays of palette indexes.
 
     :param block_size: The size of the transparent pixel blocks
     the origin pixel sits in the middle of. Better-looking results
     with an odd number.
+    :param fill_value: The value of transparent pixels, 255 for palette indexes.
     """
     img = np.asarray(image)
-    styled_img = np.zeros(
-        (img.shape[0] * block_size, img.shape[1] * block_size, 4), dtype=np.uint8
+    styled_img = np.full(
+        (img.shape[0] * block_size, img.shape[1] * block_size) + img.shape[2:],
+        fill_value,
+        dtype=np.uint8,
     )
     idx_y = [block_size // 2 + i for i in range(0, styled_img.shape[0], block_size)]
     idx_x = [block_size // 2 + i for i in range(0, styled_img.shape[1], block_size)]
@@ -61,21 +66,33 @@ def cooldown(num_users: int):
     return 2.5 * np.sqrt(num_users + 11.96) + 6.5
 
 
-class BadResponseError(Exception):
-    """Raised when response code isn't 200."""
-
-
-async def query(url, content_type):
+async def query(url, content_type, endpoint: Optional[str] = None):
     """
     Send a GET request to the specified url  and return the content of the reponse.
 
     :param content_type: 'json' or 'binary'
+    :param endpoint: A label to group the request's statistics under.
+    """
+    content, _ = await http_client.fetch(url, content_type, endpoint=endpoint)
+    return content
+
+
+async def query_into(
+    url: str, buffer: np.ndarray, endpoint: Optional[str] = None
+) -> int:
+    """
+    Send a GET request to the specified url and stream the content of the response
+    into a preallocated contiguous uint8 buffer.
+
+    :param endpoint: A label to group the request's statistics under.
+    :return: The number of bytes received.
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status == 200:
-                if content_type == "json":
-                    return await response.json()
-                if content_type == "binary":
-                    return await response.read()
-            raise BadResponseError("Query returned {response.status} code.")
+    view = memoryview(buffer).cast("B")
+    size = 0
+    async with http_client.get(url, endpoint=endpoint) as response:
+        async for chunk in response.content.iter_any():
+            if size + len(chunk) > len(view):
+                raise BadResponseError("Response is larger than expected.")
+            view[size : size + len(chunk)] = chunk
+            size += len(chunk)
+    return size
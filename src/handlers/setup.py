@@ -3,9 +3,10 @@ import asyncio
 import logging
 from typing import List, Optional
 from dotenv import load_dotenv
-from handlers.pxls import Canvas
+from handlers.pxls import Canvas, ProgressTracker, BoardHistory
 from handlers.database import TemplateManager, StatsManager
 from handlers.imgur_uploader import ImgurUploader
+from handlers.image import RenderCache
 from handlers.websocket import WebsocketClient
 
 logger = logging.getLogger("pyCharity." + __name__)
@@ -28,18 +29,46 @@ invite_url = os.getenv("INVITE_LINK", "")
 
 # Canvas
 base_url = os.environ["PXLS_URL"]
-canvas = Canvas(base_url=base_url)
+heatmap_half_life = os.getenv("HEATMAP_HALF_LIFE")
+canvas = Canvas(
+    base_url=base_url,
+    snapshot_dir=os.getenv("BOARD_SNAPSHOT_DIR") or None,
+    heatmap_half_life=float(heatmap_half_life) * 3600 if heatmap_half_life else None,
+)
 asyncio.get_event_loop().run_until_complete(canvas.setup())
 
 # Template manager
-template_manager = TemplateManager(os.environ["DB_CONNECTION"])
+template_manager = TemplateManager(
+    os.environ["DB_CONNECTION"],
+    image_cache_size=int(os.getenv("TEMPLATE_CACHE_SIZE", "256")) * 1024 * 1024,
+)
+if os.getenv("TEMPLATE_CHANGE_STREAMS", "").lower() in ("1", "true", "yes"):
+    asyncio.get_event_loop().create_task(template_manager.watch_changes())
 
 # Stats manager
 stats_manager = StatsManager(os.environ["DB_CONNECTION"])
 
+# Live template progress
+progress_tracker = ProgressTracker()
+canvas.add_pixel_listener(progress_tracker.on_pixels)
+
+# Board history
+history_dir = os.getenv("HISTORY_DIR")
+history = BoardHistory(history_dir, canvas) if history_dir else None
+if history is not None:
+    canvas.add_pixel_listener(history.on_pixels)
+
 # Websocket
-ws_client = WebsocketClient(uri=os.environ["PXLS_WEBSOCKET"], canvas=canvas)
+ws_client = WebsocketClient(
+    uri=os.environ["PXLS_WEBSOCKET"],
+    canvas=canvas,
+    resync_loop=asyncio.get_event_loop(),
+)
 ws_client.start()
 
+# Rendered images
+render_cache = RenderCache(int(os.getenv("RENDER_CACHE_SIZE", "64")) * 1024 * 1024)
+BOARD_MAX_AGE = float(os.getenv("BOARD_MAX_AGE", "5"))
+
 # Imgur client
 image_uploader = ImgurUploader(os.environ["IMGUR_CLIENT_ID"])
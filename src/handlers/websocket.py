@@ -1,55 +1,257 @@
 import asyncio
 import logging
 import json
+import random
 import threading
+import time
+import numpy as np
 import websockets
 
 
 logger = logging.getLogger("pyCharity." + __name__)
 
 
+class IngestMetrics:
+    """
+    Counters describing how well the websocket client keeps up with the pixel stream.
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.pixels = 0
+        self.queue_depth = 0
+        self.reconnects = 0
+        self.last_gap = 0.0
+        self.last_resync = 0.0
+        self._window_start = time.monotonic()
+        self._window_messages = 0
+        self._window_pixels = 0
+        self._window_batches = 0
+        self._window_latency = 0.0
+        self._window_max_latency = 0.0
+        self._window_max_depth = 0
+
+    def record(self, messages: int, pixels: int, latency: float, queue_depth: int):
+        """
+        Record a processed batch.
+
+        :param latency: The time it took to decode and apply the batch, in seconds.
+        :param queue_depth: The number of messages still waiting in the queue.
+        """
+        self.messages += messages
+        self.pixels += pixels
+        self.queue_depth = queue_depth
+        self._window_messages += messages
+        self._window_pixels += pixels
+        self._window_batches += 1
+        self._window_latency += latency
+        self._window_max_latency = max(latency, self._window_max_latency)
+        self._window_max_depth = max(queue_depth, self._window_max_depth)
+
+    def record_reconnect(self, gap: float):
+        """
+        Record a reconnection.
+
+        :param gap: The time during which the websocket was disconnected, in seconds.
+        """
+        self.reconnects += 1
+        self.last_gap = gap
+
+    def record_resync(self, duration: float):
+        """
+        Record a board resynchronisation.
+
+        :param duration: The time it took to fetch and swap the board, in seconds.
+        """
+        self.last_resync = duration
+
+    def report(self) -> dict:
+        """
+        Get the rates and latencies measured since the last report, and start a new
+        measurement window.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._window_start, 1e-9)
+        batches = max(self._window_batches, 1)
+        report = {
+            "messages_per_s": self._window_messages / elapsed,
+            "pixels_per_s": self._window_pixels / elapsed,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._window_max_depth,
+            "apply_latency_ms": 1000 * self._window_latency / batches,
+            "max_apply_latency_ms": 1000 * self._window_max_latency,
+            "reconnects": self.reconnects,
+            "last_gap_s": self.last_gap,
+            "last_resync_s": self.last_resync,
+        }
+        self._window_start = now
+        self._window_messages = self._window_pixels = self._window_batches = 0
+        self._window_latency = self._window_max_latency = 0.0
+        self._window_max_depth = 0
+        return report
+
+
 class WebsocketClient:
     """
     A threaded websocket client in charge of updating the canvas board in real-time.
+
+    Received messages are queued as-is, and a consumer decodes and applies them
+    to the canvas in batches. After a reconnection, the board is fetched again
+    right away so that the pixels placed while disconnected aren't missed.
     """
 
-    def __init__(self, uri: str, canvas):
+    def __init__(
+        self,
+        uri: str,
+        canvas,
+        resync_loop: asyncio.AbstractEventLoop,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        max_backoff: float = 60,
+    ):
+        """
+        :param uri: The websocket's uri.
+        :param canvas: The canvas to apply pixel updates to.
+        :param resync_loop: The event loop the board is fetched on after a reconnection.
+        :param queue_size: The maximum number of messages waiting to be processed.
+        :param batch_size: The maximum number of messages processed at once.
+        :param max_backoff: The maximum delay between reconnection attempts, in seconds.
+        """
         self.uri = uri
         self.canvas = canvas
+        self.resync_loop = resync_loop
+        self.max_backoff = max_backoff
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.metrics = IngestMetrics()
         self.loop = asyncio.new_event_loop()
         self.thread = threading.Thread(target=self._start, daemon=True)
-        self._paused = False
 
     def start(self):
         """Start the websocket in a separate thread."""
         self.thread.start()
 
     def _start(self):
-        self.loop.run_until_complete(self._listen())
-
-    def pause(self):
-        """Pause all websocket processing."""
-        self._paused = True
+        self.loop.run_until_complete(self._run())
 
-    def resume(self):
-        """Resume all websocket processing."""
-        self._paused = False
+    async def _run(self):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        await asyncio.gather(self._listen(queue), self._consume(queue))
 
-    async def _listen(self):
+    async def _listen(self, queue: asyncio.Queue):
+        disconnected_at = None
+        backoff = 1.0
         while True:
             try:
                 async with websockets.connect(self.uri) as websocket:
                     logger.info("Connected to websocket.")
+                    backoff = 1.0
+                    if disconnected_at is not None:
+                        gap = time.monotonic() - disconnected_at
+                        self.metrics.record_reconnect(gap)
+                        logger.info(f"Websocket was disconnected for {gap:.1f}s.")
+                        asyncio.run_coroutine_threadsafe(
+                            self._resync(), self.resync_loop
+                        )
+                        disconnected_at = None
                     async for message in websocket:
-                        while self._paused:
-                            pass
-                        try:
-                            data = json.loads(message)
-                            if data["type"] == "pixel":
-                                for update in data["pixels"]:
-                                    self.canvas.update_pixel(**update)
-                        except Exception as error:
-                            logger.warning(f"Websocket client raised {error}")
+                        await queue.put(message)
             except Exception as error:
                 logger.warning(f"Websocket disconnected: {error}")
-                logger.info("Attempting reconnect...")
+            if disconnected_at is None:
+                disconnected_at = time.monotonic()
+            delay = random.uniform(backoff / 2, backoff)
+            logger.info(f"Attempting reconnect in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            backoff = min(2 * backoff, self.max_backoff)
+
+    async def _resync(self):
+        """
+        Fetch the board again, the pixel updates received in the meantime being
+        replayed onto it.
+        """
+        start = time.monotonic()
+        try:
+            if not await self.canvas.update_board():
+                logger.debug("Board is already being updated, skipping resync.")
+                return
+        except Exception as error:
+            logger.warning(f"Error while resyncing board: {error}")
+            return
+        duration = time.monotonic() - start
+        self.metrics.record_resync(duration)
+        logger.info(f"Board resynced in {duration:.1f}s.")
+
+    async def _consume(self, queue: asyncio.Queue):
+        while True:
+            messages = [await queue.get()]
+            while len(messages) < self.batch_size and not queue.empty():
+                messages.append(queue.get_nowait())
+            start = time.perf_counter()
+            try:
+                pixels = self._apply(messages)
+            except Exception as error:
+                logger.warning(f"Websocket client raised {error}")
+                pixels = 0
+            self.metrics.record(
+                len(messages), pixels, time.perf_counter() - start, queue.qsize()
+            )
+
+    @staticmethod
+    def _decode(messages: list) -> list:
+        """
+        Decode a batch of messages, with a single parser call when they are all valid.
+        Invalid messages are skipped.
+        """
+        try:
+            return json.loads("[" + ",".join(messages) + "]")
+        except (TypeError, ValueError):
+            decoded = []
+            for message in messages:
+                try:
+                    decoded.append(json.loads(message))
+                except (TypeError, ValueError) as error:
+                    logger.warning(f"Skipping invalid websocket message: {error}")
+            return decoded
+
+    @staticmethod
+    def _read_pixels(data) -> list:
+        """
+        Get the (x, y, color) pixel updates of a decoded message.
+        Malformed pixel updates are skipped.
+        """
+        if not isinstance(data, dict) or data.get("type") != "pixel":
+            return []
+        pixels = data.get("pixels")
+        if not isinstance(pixels, list):
+            logger.warning("Skipping pixel message without a list of pixels.")
+            return []
+        updates = []
+        for update in pixels:
+            try:
+                x, y, color = int(update["x"]), int(update["y"]), int(update["color"])
+            except (KeyError, TypeError, ValueError) as error:
+                logger.warning(f"Skipping malformed pixel update: {error!r}")
+                continue
+            # Out-of-board coordinates are dropped by the board itself,
+            # these are only kept small enough to fit in the coordinate arrays.
+            if 0 <= x < 1 << 31 and 0 <= y < 1 << 31 and 0 <= color <= 255:
+                updates.append((x, y, color))
+        return updates
+
+    def _apply(self, messages: list) -> int:
+        """
+        Apply the pixel updates contained in a batch of messages to the canvas.
+
+        :return: The number of pixel updates applied.
+        """
+        updates = [
+            update
+            for data in self._decode(messages)
+            for update in self._read_pixels(data)
+        ]
+        if len(updates) == 0:
+            return 0
+        xs, ys, colors = np.array(updates, dtype=np.int64).T
+        self.canvas.update_pixels(xs, ys, colors.astype(np.uint8))
+        return len(updates)
@@ -2,13 +2,28 @@ import os
 from discord.ext import commands
 from discord_slash import SlashCommand
 from handlers import logging_formatter
+from handlers.http_client import http_client
 
 
 # Create root logger
 logger = logging_formatter.root_logger("pyCharity", level="DEBUG")
 
+
+class Bot(commands.Bot):
+    """
+    The bot, closing the shared HTTP client's connections on shutdown.
+    """
+
+    async def close(self):
+        """
+        Close the bot, then the shared HTTP client.
+        """
+        await super().close()
+        await http_client.close()
+
+
 # Create bot
-bot = commands.Bot(command_prefix="!")
+bot = Bot(command_prefix="!")
 slash = SlashCommand(bot, sync_commands=True, sync_on_cog_reload=True)
 
 